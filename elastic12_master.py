@@ -4,8 +4,17 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import logging
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import sys
+import os
+import json
+import itertools
+import datetime
+import math
+import hashlib
+import re
+import glob
+import threading
 import pandas as pd
 import csv
 import codecs
@@ -34,6 +43,23 @@ es = Elasticsearch(
 index_name = "baza10"
 fake = Faker('ru_RU')
 
+# Параметры очереди импорта
+MAX_CONCURRENT_IMPORT_JOBS = 4
+MAX_IN_FLIGHT_BULK_BYTES = 64 * 1024 * 1024  # суммарный объём одновременно отправляемых bulk-запросов
+IMPORT_QUEUE_BATCH_SIZE = 1000
+
+# Параметры дедупликации при импорте
+DEDUP_MEMORY_LIMIT_MB = 128
+DEDUP_BLOOM_ERROR_RATE = 0.001
+DEDUP_EXACT_ENTRY_BYTES = 100  # примерный расход памяти на один хеш в множестве Python
+
+# Параметры планирования шардов
+TARGET_SHARD_SIZE_GB = 30
+MAX_PLANNED_SHARDS = 32
+MAX_BULK_CONCURRENCY = 8  # bulk-потоков на один файл
+SHARD_PLAN_SAMPLE_SIZE = 1000  # документов в выборке для оценки размера
+INDEX_SIZE_OVERHEAD = 1.5  # размер в индексе относительно JSON (text + keyword подполя)
+
 def check_elasticsearch_health():
     """Проверка здоровья кластера Elasticsearch"""
     """Проверка здоровья кластера Elasticsearch"""
@@ -45,21 +71,30 @@ def check_elasticsearch_health():
         logging.error(f"Failed to check Elasticsearch health: {e}")
         return False
 
-def create_index():
-    """Создание индекса с динамическим маппингом"""
+def create_index(target_index=None, interactive=True, number_of_shards=1):
+    """
+    Создание индекса с динамическим маппингом
+
+    Args:
+        target_index (str): Имя индекса (по умолчанию текущий index_name)
+        interactive (bool): Показывать ошибку в окне; иначе исключение пробрасывается
+                            (используется фоновыми задачами импорта)
+        number_of_shards (int): Число шардов (см. plan_shards)
+    """
+    target_index = target_index or index_name
     try:
         if not check_elasticsearch_health():
             raise Exception("Elasticsearch cluster is not healthy")
 
-        if es.indices.exists(index=index_name):
-            logging.info(f"Индекс {index_name} существует, удаляем...")
-            es.indices.delete(index=index_name)
+        if es.indices.exists(index=target_index):
+            logging.info(f"Индекс {target_index} существует, удаляем...")
+            es.indices.delete(index=target_index)
             time.sleep(2)
 
         index_settings = {
             "settings": {
                 "index": {
-                    "number_of_shards": 1,
+                    "number_of_shards": number_of_shards,
                     "number_of_replicas": 0,
                     "refresh_interval": "30s"
                 }
@@ -69,11 +104,14 @@ def create_index():
             }
         }
 
-        es.indices.create(index=index_name, body=index_settings)
-        logging.info(f"Индекс {index_name} создан успешно.")
+        es.indices.create(index=target_index, body=index_settings)
+        invalidate_column_layout(target_index)
+        logging.info(f"Индекс {target_index} создан успешно.")
         return True
     except Exception as e:
         logging.error(f"Ошибка при создании индекса: {e}")
+        if not interactive:
+            raise
         messagebox.showerror("Ошибка", f"Не удалось создать индекс: {str(e)}")
         return False
 
@@ -106,115 +144,664 @@ def preprocess_data(row_dict):
     return processed
 
 
-def import_csv_in_batches(file_path, encoding, delimiter, skip_first=True, batch_size=100):
+class BulkBytesLimiter:
+    """
+    Глобальный лимит на объём данных в одновременно выполняемых bulk-запросах.
+    Позволяет нескольким задачам импорта грузить кластер параллельно,
+    не перегружая его память и очередь bulk.
     """
-    Импорт данных из CSV файла в Elasticsearch батчами по 100 записей.
-    Все поля импортируются как текст, пустые значения заменяются на пробел.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size):
+        """Ожидает, пока в лимите освободится место под батч, и резервирует его"""
+        # Батч больше лимита целиком занимает конвейер, но не блокируется навсегда
+        size = min(size, self.max_bytes)
+        with self._condition:
+            while self.in_flight + size > self.max_bytes:
+                self._condition.wait()
+            self.in_flight += size
+        return size
+
+    def release(self, size):
+        with self._condition:
+            self.in_flight -= size
+            self._condition.notify_all()
+
+
+def estimate_batch_bytes(batch):
+    """Грубая оценка размера батча в теле bulk-запроса (без сериализации)"""
+    return sum(
+        sum(len(str(key)) + len(str(value)) + 6 for key, value in doc.items()) + 40
+        for doc in batch
+    )
+
+
+class BulkImportError(Exception):
+    """Часть записей не была принята Elasticsearch при импорте"""
+
+    def __init__(self, target_index, imported, failed, invalid=0):
+        message = f"Не импортировано {failed} записей в {target_index} (импортировано {imported})"
+        if invalid:
+            message += f", из них некорректных строк в файле: {invalid}"
+        super().__init__(message)
+        self.imported = imported
+        self.failed = failed
+        self.invalid = invalid
+
+
+def send_bulk_batch(batch, target_index, bulk_limiter=None, routing_column=None):
+    """
+    Отправка одного батча через bulk API
 
     Args:
-        file_path (str): Путь к CSV файлу
-        encoding (str): Кодировка файла
-        delimiter (str): Разделитель полей
-        skip_first (bool): Пропустить первую строку (заголовки)
-        batch_size (int): Размер батча для импорта
+        batch (list): Пары (_id или None, документ)
+
+    Returns:
+        tuple: (оценка объёма отправленных данных в байтах, число отклонённых записей)
     """
+    actions = []
+    for doc_id, doc in batch:
+        action = {
+            "_index": target_index,
+            "_source": doc
+        }
+        if doc_id is not None:
+            action["_id"] = doc_id
+        if routing_column:
+            routing = doc.get(routing_column)
+            if routing not in (None, "", " "):
+                action["_routing"] = str(routing)
+        actions.append(action)
+
+    batch_bytes = estimate_batch_bytes([doc for _, doc in batch])
+    reserved = bulk_limiter.acquire(batch_bytes) if bulk_limiter else 0
     try:
-        with codecs.open(file_path, 'r', encoding=encoding) as f:
-            reader = csv.reader(f, delimiter=delimiter)
+        _, errors = helpers.bulk(es, actions, raise_on_error=False)
+    finally:
+        if bulk_limiter:
+            bulk_limiter.release(reserved)
+    if errors:
+        logging.error(f"Bulk: отклонено {len(errors)} записей в {target_index}, например: {errors[0]}")
+    return batch_bytes, len(errors)
 
-            # Читаем первую строку для определения количества колонок
-            first_row = next(reader)
-            num_columns = len(first_row)
 
-            # Генерируем заголовки, если первая строка не содержит их
-            # или если они пустые
-            headers = []
-            using_generated_headers = False
+def check_routing_column(routing_column, document):
+    """
+    Колонка маршрутизации должна быть в данных: иначе все записи молча
+    уходят без _routing и распределяются по шардам по _id
+    """
+    if routing_column not in document:
+        raise Exception(f"Колонка маршрутизации не найдена: {routing_column}. "
+                        f"Доступные колонки: {', '.join(map(str, document))}")
 
-            if all(not header.strip() for header in first_row):
-                # Если все заголовки пустые, генерируем новые
-                headers = [f'col{i + 1}' for i in range(num_columns)]
+
+def source_id_prefix(file_path):
+    """Префикс детерминированных _id записей файла: повторный импорт перезаписывает их"""
+    return hashlib.blake2b(os.path.abspath(file_path).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def make_headers(first_row):
+    """
+    Заголовки по первой строке файла: пустые заменяются на colN.
+
+    Returns:
+        tuple: (список заголовков, были ли заголовки сгенерированы)
+    """
+    num_columns = len(first_row)
+    headers = []
+    using_generated_headers = False
+
+    if all(not str(header or '').strip() for header in first_row):
+        # Если все заголовки пустые, генерируем новые
+        headers = [f'col{i + 1}' for i in range(num_columns)]
+        using_generated_headers = True
+    else:
+        # Проверяем каждый заголовок и заменяем пустые на сгенерированные
+        for i, header in enumerate(first_row):
+            if not str(header or '').strip():
+                headers.append(f'col{i + 1}')
                 using_generated_headers = True
             else:
-                # Проверяем каждый заголовок и заменяем пустые на сгенерированные
-                for i, header in enumerate(first_row):
-                    if not header.strip():
-                        headers.append(f'col{i + 1}')
-                        using_generated_headers = True
-                    else:
-                        headers.append(header.strip())
+                headers.append(str(header).strip())
+    return headers, using_generated_headers
+
+
+def to_native_value(value):
+    """
+    Приведение значения из Parquet/JSON/XLSX к виду, который принимает Elasticsearch,
+    с сохранением исходного типа (числа, даты, bool остаются как есть)
+    """
+    if isinstance(value, float) and value != value:
+        return None  # NaN
+    if isinstance(value, datetime.time):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()  # duration-колонки Parquet; сериализатор ES их не знает
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, dict):
+        return {key: to_native_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_native_value(item) for item in value]
+    return value
+
+
+def iter_csv_documents(file_path, encoding, delimiter, skip_first=True):
+    """Построчное чтение CSV: все поля как текст, пустые значения заменяются на пробел"""
+    with codecs.open(file_path, 'r', encoding=encoding) as f:
+        reader = csv.reader(f, delimiter=delimiter)
+
+        # Читаем первую строку для определения заголовков
+        # (bare next() внутри генератора превратился бы в RuntimeError на пустом файле)
+        try:
+            headers, using_generated_headers = make_headers(next(reader))
 
             # Если skip_first=True и мы не сгенерировали заголовки,
             # пропускаем следующую строку
             if skip_first and not using_generated_headers:
                 next(reader)
+        except StopIteration:
+            return
+
+        for row in reader:
+            # Создаем словарь, заменяя пустые значения на пробел
+            document = {}
+            for i, value in enumerate(row):
+                if i < len(headers):
+                    # Заменяем пустые значения и nan на пробел
+                    cleaned_value = value.strip()
+                    if not cleaned_value or cleaned_value.lower() == 'nan':
+                        cleaned_value = ' '
+                    document[headers[i]] = cleaned_value
+            yield document
+
+
+def iter_ndjson_documents(file_path, encoding):
+    """
+    Построчное чтение JSON Lines (NDJSON), каждая строка - один объект.
+    Вместо некорректной строки выдаётся None, чтобы импорт учёл её как ошибку.
+    """
+    # newline='' - строки делятся только по \n, \r и \r\n; codecs.open делил бы и по
+    # U+2028, U+0085 и т.п., которые допустимы внутри строк JSON
+    with open(file_path, 'r', encoding=encoding, newline='') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                document = json.loads(line)
+            except ValueError as e:
+                logging.error(f"Пропущена строка {line_number} в {file_path}: {e}")
+                yield None
+                continue
+            if not isinstance(document, dict):
+                logging.error(f"Пропущена строка {line_number} в {file_path}: ожидался объект JSON")
+                yield None
+                continue
+            yield to_native_value(document)
+
+
+def iter_parquet_documents(file_path, batch_size=1000):
+    """Чтение Parquet порциями record batch через Arrow, без загрузки файла целиком"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise Exception("Для импорта Parquet установите пакет pyarrow")
+
+    parquet_file = pq.ParquetFile(file_path)
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+        for document in record_batch.to_pylist():
+            yield to_native_value(document)
+
+
+def iter_xlsx_documents(file_path):
+    """Потоковое чтение первого листа XLSX в режиме read-only, первая строка - заголовки"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise Exception("Для импорта XLSX установите пакет openpyxl")
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        try:
+            headers, _ = make_headers(next(rows))
+        except StopIteration:
+            return  # пустой лист
+        for row in rows:
+            if all(value is None for value in row):
+                continue  # пустые строки в конце листа
+            yield {
+                headers[i]: to_native_value(value)
+                for i, value in enumerate(row)
+                if i < len(headers) and value is not None
+            }
+    finally:
+        workbook.close()
+
+
+# Поддерживаемые форматы источников: расширение файла -> формат
+SOURCE_FORMATS = {
+    ".csv": "csv",
+    ".txt": "csv",
+    ".tsv": "csv",
+    ".jsonl": "ndjson",
+    ".ndjson": "ndjson",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".xlsx": "xlsx",
+    ".xlsm": "xlsx",
+}
+
+IMPORT_FILE_TYPES = [
+    ("Все поддерживаемые", "*.csv *.txt *.tsv *.jsonl *.ndjson *.parquet *.pq *.xlsx *.xlsm"),
+    ("CSV files", "*.csv"),
+    ("Text files", "*.txt"),
+    ("JSON Lines", "*.jsonl *.ndjson"),
+    ("Parquet", "*.parquet *.pq"),
+    ("Excel files", "*.xlsx *.xlsm"),
+    ("All files", "*.*")
+]
+
+
+def detect_source_format(file_path):
+    """Формат файла по расширению (неизвестные расширения читаются как CSV)"""
+    return SOURCE_FORMATS.get(os.path.splitext(file_path)[1].lower(), "csv")
+
+
+def iter_source_documents(file_path, encoding, delimiter, skip_first=True,
+                          source_format=None, batch_size=1000):
+    """Потоковое чтение документов из файла любого поддерживаемого формата"""
+    source_format = source_format or detect_source_format(file_path)
+    if source_format == "ndjson":
+        return iter_ndjson_documents(file_path, encoding)
+    if source_format == "parquet":
+        return iter_parquet_documents(file_path, batch_size)
+    if source_format == "xlsx":
+        return iter_xlsx_documents(file_path)
+    return iter_csv_documents(file_path, encoding, delimiter, skip_first)
+
+
+def preview_source_file(file_path, encoding, delimiter, source_format=None):
+    """Показать первые 5 записей файла"""
+    source_format = source_format or detect_source_format(file_path)
+    if source_format == "csv":
+        return preview_csv_file(file_path, encoding, delimiter)
+    try:
+        documents = iter_source_documents(file_path, encoding, delimiter, source_format=source_format)
+        documents = (document for document in documents if document is not None)
+        return [json.dumps(document, ensure_ascii=False, default=str)
+                for document in itertools.islice(documents, 5)]
+    except Exception as e:
+        return [f"Ошибка предпросмотра: {str(e)}"]
+
+
+class BloomFilter:
+    """Фильтр Блума на bytearray: фиксированный объём памяти, заданная доля ложных срабатываний"""
+
+    def __init__(self, num_bits, error_rate):
+        self.num_bits = max(8, num_bits)
+        # Ёмкость, при которой достигается заданная доля ложных срабатываний
+        self.capacity = max(1, int(self.num_bits * math.log(2) ** 2 / -math.log(error_rate)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def add(self, digest):
+        """
+        Добавляет хеш (не короче 16 байт) в фильтр
+
+        Returns:
+            bool: True, если элемент, возможно, уже встречался
+        """
+        # Двойное хеширование: позиции h1 + i * h2
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        present = True
+        for i in range(self.num_hashes):
+            position = (h1 + i * h2) % self.num_bits
+            byte_index, mask = position >> 3, 1 << (position & 7)
+            if not self.bits[byte_index] & mask:
+                present = False
+                self.bits[byte_index] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+
+class DuplicateFilter:
+    """
+    Подавление дубликатов при импорте по хешу всей строки или ключевых колонок.
+    Лимит памяти делится пополам: точное множество хешей растёт до половины,
+    затем переносится в фильтр Блума на вторую половину. В момент переноса
+    живут обе структуры, так что пиковый расход - около memory_limit_mb.
+    """
+
+    def __init__(self, key_columns=None, memory_limit_mb=DEDUP_MEMORY_LIMIT_MB,
+                 error_rate=DEDUP_BLOOM_ERROR_RATE):
+        self.key_columns = list(key_columns or [])
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.error_rate = error_rate
+        self.max_exact_entries = max(1, self.memory_limit // 2 // DEDUP_EXACT_ENTRY_BYTES)
+        self.exact = set()
+        self.bloom = None
+        self.dropped = 0
+        self._columns_checked = False
+
+    def check_key_columns(self, document):
+        """
+        Ключевые колонки должны быть в данных: иначе у всех строк одинаковый хеш
+        и импортируется только первая
+        """
+        missing = [column for column in self.key_columns if column not in document]
+        if missing:
+            raise Exception(f"Ключевые колонки не найдены: {', '.join(missing)}. "
+                            f"Доступные колонки: {', '.join(map(str, document))}")
+        self._columns_checked = True
+
+    def document_digest(self, document):
+        if self.key_columns:
+            key = [document.get(column) for column in self.key_columns]
+        else:
+            key = document
+        serialized = json.dumps(key, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.blake2b(serialized.encode('utf-8'), digest_size=16).digest()
+
+    def _switch_to_bloom(self):
+        self.bloom = BloomFilter(self.memory_limit // 2 * 8, self.error_rate)
+        for digest in self.exact:
+            self.bloom.add(digest)
+        self.exact = set()
+        logging.info(f"Дедупликация: точное множество достигло лимита, переход на фильтр Блума "
+                     f"({self.memory_limit / 2 / 1024 / 1024:.0f} МБ, ёмкость {self.bloom.capacity}, "
+                     f"ошибка {self.error_rate})")
+
+    def is_duplicate(self, document):
+        """Проверяет документ и запоминает его; дубликаты учитываются в dropped"""
+        if not self._columns_checked:
+            self.check_key_columns(document)
+        digest = self.document_digest(document)
+        if self.bloom is None:
+            if digest in self.exact:
+                self.dropped += 1
+                return True
+            self.exact.add(digest)
+            if len(self.exact) >= self.max_exact_entries:
+                self._switch_to_bloom()
+            return False
+
+        if self.bloom.add(digest):
+            self.dropped += 1
+            return True
+        if self.bloom.count == self.bloom.capacity + 1:
+            logging.warning("Дедупликация: превышена ёмкость фильтра Блума, "
+                            "доля ложных срабатываний растёт")
+        return False
+
 
+def parse_column_list(text):
+    """Список колонок из строки через запятую"""
+    return [column.strip() for column in text.split(",") if column.strip()]
+
+
+def parse_error_rate(text):
+    """Доля ложных срабатываний фильтра Блума из строки (0 < p < 1)"""
+    try:
+        error_rate = float(text.replace(",", "."))
+    except ValueError:
+        error_rate = 0
+    if not 0 < error_rate < 1:
+        raise Exception("Доля ложных срабатываний должна быть числом больше 0 и меньше 1")
+    return error_rate
+
+
+def iter_batches(documents, batch_size):
+    """Разбиение потока документов на батчи"""
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
             batch = []
-            total_processed = 0
-
-            for row in reader:
-                # Создаем словарь, заменяя пустые значения на пробел
-                document = {}
-                for i, value in enumerate(row):
-                    if i < len(headers):
-                        # Заменяем пустые значения и nan на пробел
-                        cleaned_value = value.strip()
-                        if not cleaned_value or cleaned_value.lower() == 'nan':
-                            cleaned_value = ' '
-                        document[headers[i]] = cleaned_value
-
-                batch.append(document)
-
-                # Если набрали батч - импортируем
-                if len(batch) >= batch_size:
-                    try:
-                        actions = [
-                            {
-                                "_index": index_name,
-                                "_source": doc
-                            }
-                            for doc in batch
-                        ]
-                        helpers.bulk(es, actions)
-                        total_processed += len(batch)
-                        logging.info(f"Импортировано {total_processed} записей")
-
-                        # Очищаем батч
-                        batch = []
-
-                    except Exception as e:
-                        logging.error(f"Ошибка при импорте батча: {e}")
-                        continue
-
-            # Импортируем оставшиеся записи
-            if batch:
-                try:
-                    actions = [
-                        {
-                            "_index": index_name,
-                            "_source": doc
-                        }
-                        for doc in batch
-                    ]
-                    helpers.bulk(es, actions)
-                    total_processed += len(batch)
-                    logging.info(f"Импортировано {total_processed} записей")
+    if batch:
+        yield batch
 
-                except Exception as e:
-                    logging.error(f"Ошибка при импорте последнего батча: {e}")
 
-            return total_processed
+def import_documents_in_batches(documents, target_index, batch_size=100,
+                                bulk_limiter=None, progress_callback=None, duplicate_filter=None,
+                                concurrency=1, routing_column=None, id_prefix=None):
+    """
+    Отправка потока документов в Elasticsearch батчами через bulk API.
+    При concurrency > 1 в работе одновременно до concurrency bulk-запросов,
+    чтобы индексация шла во все шарды, а память оставалась ограниченной.
+
+    Args:
+        documents: Поток документов; None - некорректная запись источника,
+                   она учитывается как неимпортированная
+        id_prefix (str): Если задан, записи получают _id вида <префикс>-<номер строки>,
+                         и повторный импорт того же файла не создаёт дубликатов
+
+    Returns:
+        int: Количество импортированных записей
+
+    Raises:
+        BulkImportError: Если часть записей не была импортирована
+    """
+    total_processed = 0
+    total_failed = 0
+    total_invalid = 0
+    total_bytes = 0
+
+    def numbered_documents():
+        nonlocal total_invalid
+        routing_checked = not routing_column
+        # Номер строки присваивается до дедупликации, чтобы _id не зависели от неё
+        for row_number, document in enumerate(documents, 1):
+            if document is None:
+                total_invalid += 1
+                continue
+            if not routing_checked:
+                # Проверка по первой записи, как у ключевых колонок DuplicateFilter
+                check_routing_column(routing_column, document)
+                routing_checked = True
+            yield f"{id_prefix}-{row_number}" if id_prefix else None, document
+
+    items = numbered_documents()
+    if duplicate_filter:
+        items = (item for item in items if not duplicate_filter.is_duplicate(item[1]))
+
+    def account(batch_len, send_batch):
+        nonlocal total_processed, total_failed, total_bytes
+        try:
+            batch_bytes, failed = send_batch()
+        except Exception as e:
+            logging.error(f"Ошибка при импорте батча: {e}")
+            batch_bytes, failed = 0, batch_len
+        total_bytes += batch_bytes
+        total_processed += batch_len - failed
+        total_failed += failed
+        logging.info(f"Импортировано {total_processed} записей в {target_index}")
+        if progress_callback:
+            progress_callback(total_processed, total_bytes)
+
+    if concurrency <= 1:
+        for batch in iter_batches(items, batch_size):
+            account(len(batch), lambda: send_bulk_batch(batch, target_index, bulk_limiter, routing_column))
+    else:
+        pending = {}
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bulk") as executor:
+            for batch in iter_batches(items, batch_size):
+                if len(pending) >= concurrency:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        account(pending.pop(future), future.result)
+                future = executor.submit(send_bulk_batch, batch, target_index, bulk_limiter, routing_column)
+                pending[future] = len(batch)
+            for future in list(pending):
+                account(pending.pop(future), future.result)
+
+    if total_failed or total_invalid:
+        raise BulkImportError(target_index, total_processed, total_failed + total_invalid, total_invalid)
+    return total_processed
+
+
+def estimate_source_size(file_path, encoding, delimiter, skip_first=True, source_format=None):
+    """
+    Оценка итогового объёма индекса по размеру файла и выборке документов
+
+    Returns:
+        tuple: (оценка числа документов, оценка размера индекса в байтах)
+    """
+    source_format = source_format or detect_source_format(file_path)
+    file_size = os.path.getsize(file_path)
+
+    documents = iter_source_documents(file_path, encoding, delimiter, skip_first, source_format)
+    sample = list(itertools.islice(
+        (document for document in documents if document is not None),
+        SHARD_PLAN_SAMPLE_SIZE
+    ))
+    if not sample:
+        return 0, 0
+    bytes_per_document = sum(
+        len(json.dumps(document, ensure_ascii=False, default=str).encode('utf-8'))
+        for document in sample
+    ) / len(sample) * INDEX_SIZE_OVERHEAD
+
+    estimated_docs = None
+    if source_format == "parquet":
+        import pyarrow.parquet as pq
+        estimated_docs = pq.ParquetFile(file_path).metadata.num_rows
+    elif source_format == "xlsx":
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            max_row = workbook.active.max_row
+        finally:
+            workbook.close()
+        estimated_docs = max_row - 1 if max_row else None
+
+    if estimated_docs is None:
+        if len(sample) < SHARD_PLAN_SAMPLE_SIZE:
+            # Файл прочитан целиком
+            estimated_docs = len(sample)
+        else:
+            # Средний размер строки по первым строкам файла
+            with open(file_path, 'rb') as f:
+                sample_bytes = sum(len(line) for line in itertools.islice(f, SHARD_PLAN_SAMPLE_SIZE))
+            estimated_docs = int(file_size / (sample_bytes / SHARD_PLAN_SAMPLE_SIZE))
+
+    return estimated_docs, int(estimated_docs * bytes_per_document)
+
+
+def plan_shards(estimated_docs, estimated_bytes, target_shard_size_gb=TARGET_SHARD_SIZE_GB,
+                routing_column=None):
+    """
+    План индекса: число шардов под целевой размер шарда и параллельность импорта.
+    Без оценки (estimated_bytes=None) индекс создаётся с одним шардом.
+
+    Returns:
+        dict: estimated_docs, estimated_bytes, number_of_shards, concurrency, routing_column
+    """
+    if target_shard_size_gb <= 0:
+        raise Exception("Размер шарда должен быть больше 0")
+    number_of_shards = 1
+    if estimated_bytes is not None:
+        target_bytes = target_shard_size_gb * 1024 ** 3
+        number_of_shards = min(MAX_PLANNED_SHARDS, max(1, math.ceil(estimated_bytes / target_bytes)))
+    return {
+        "estimated_docs": estimated_docs,
+        "estimated_bytes": estimated_bytes,
+        "number_of_shards": number_of_shards,
+        "concurrency": min(number_of_shards, MAX_BULK_CONCURRENCY),
+        "routing_column": routing_column or None
+    }
+
+
+def format_shard_plan(plan):
+    """Описание плана индекса для пользователя"""
+    if plan["estimated_bytes"] is None:
+        text = "оценка отключена; "
+    else:
+        text = f"~{plan['estimated_docs']} документов, ~{plan['estimated_bytes'] / 1024 ** 3:.2f} ГБ; "
+    text += f"шардов: {plan['number_of_shards']}, потоков импорта: {plan['concurrency']}"
+    if plan["routing_column"]:
+        text += f", маршрутизация по {plan['routing_column']}"
+    return text
+
 
+def import_file_in_batches(file_path, encoding, delimiter, skip_first=True, batch_size=100,
+                           target_index=None, bulk_limiter=None, progress_callback=None,
+                           source_format=None, duplicate_filter=None, concurrency=1,
+                           routing_column=None, id_prefix=None):
+    """
+    Потоковый импорт файла CSV, JSON Lines, Parquet или XLSX в Elasticsearch.
+    Записи читаются порциями и сразу отправляются в bulk, без промежуточного CSV.
+
+    Args:
+        file_path (str): Путь к файлу
+        encoding (str): Кодировка файла (CSV и JSON Lines)
+        delimiter (str): Разделитель полей (CSV)
+        skip_first (bool): Пропустить первую строку (CSV)
+        batch_size (int): Размер батча для импорта
+        target_index (str): Индекс назначения (по умолчанию текущий index_name)
+        bulk_limiter (BulkBytesLimiter): Общий лимит объёма bulk-запросов
+        progress_callback (callable): Вызывается с (импортировано записей, отправлено байт)
+        source_format (str): csv, ndjson, parquet или xlsx (по умолчанию по расширению)
+        duplicate_filter (DuplicateFilter): Пропуск повторяющихся записей
+                                            (число пропущенных - в duplicate_filter.dropped)
+        concurrency (int): Число параллельных bulk-запросов (обычно по числу шардов)
+        routing_column (str): Колонка, значение которой используется как _routing
+        id_prefix (str): Префикс детерминированных _id (см. source_id_prefix); без него
+                         _id назначает Elasticsearch, как при обычном импорте
+
+    Если часть записей не импортирована, выбрасывается BulkImportError.
+    """
+    target_index = target_index or index_name
+    try:
+        documents = iter_source_documents(file_path, encoding, delimiter, skip_first,
+                                          source_format, batch_size)
+        return import_documents_in_batches(documents, target_index, batch_size,
+                                           bulk_limiter, progress_callback, duplicate_filter,
+                                           concurrency, routing_column, id_prefix)
+    except BulkImportError:
+        raise
     except Exception as e:
         logging.error(f"Ошибка при чтении файла: {e}")
         raise
 
 
+def import_csv_in_batches(file_path, encoding, delimiter, skip_first=True, batch_size=100,
+                          target_index=None, bulk_limiter=None, progress_callback=None,
+                          duplicate_filter=None):
+    """
+    Импорт данных из CSV файла в Elasticsearch батчами по 100 записей.
+    Все поля импортируются как текст, пустые значения заменяются на пробел.
+
+    Args:
+        file_path (str): Путь к CSV файлу
+        encoding (str): Кодировка файла
+        delimiter (str): Разделитель полей
+        skip_first (bool): Пропустить первую строку (заголовки)
+        batch_size (int): Размер батча для импорта
+        target_index (str): Индекс назначения (по умолчанию текущий index_name)
+        bulk_limiter (BulkBytesLimiter): Общий лимит объёма bulk-запросов
+        progress_callback (callable): Вызывается с (импортировано записей, отправлено байт)
+        duplicate_filter (DuplicateFilter): Пропуск повторяющихся записей
+    """
+    return import_file_in_batches(file_path, encoding, delimiter, skip_first, batch_size,
+                                  target_index, bulk_limiter, progress_callback,
+                                  source_format="csv", duplicate_filter=duplicate_filter)
+
+
 def import_csv_dialog():
-    """Диалог настроек импорта CSV"""
+    """Диалог настроек импорта CSV, JSON Lines, Parquet или XLSX"""
     dialog = tk.Toplevel()
-    dialog.title("Импорт CSV")
-    dialog.geometry("600x450")  # Увеличил высоту для нового поля
+    dialog.title("Импорт данных")
+    dialog.geometry("700x540")  # Увеличил высоту для новых полей
     dialog.grab_set()  # Делаем окно модальным
 
     # Настройки импорта
@@ -299,6 +886,34 @@ def import_csv_dialog():
     rows_entry = ttk.Entry(settings_row3, width=10)
     rows_entry.pack(side=tk.LEFT, padx=5)
 
+    # Frame для строки настроек дедупликации
+    settings_row4 = ttk.Frame(settings_frame)
+    settings_row4.pack(fill=tk.X, padx=5, pady=2)
+
+    dedup_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(settings_row4, text="Пропускать дубликаты",
+                    variable=dedup_var).pack(side=tk.LEFT, padx=5)
+    ttk.Label(settings_row4, text="Ключевые колонки (пусто = вся строка):").pack(side=tk.LEFT, padx=5)
+    key_columns_entry = ttk.Entry(settings_row4, width=25)
+    key_columns_entry.pack(side=tk.LEFT, padx=5)
+    ttk.Label(settings_row4, text="Доля ошибок фильтра:").pack(side=tk.LEFT, padx=5)
+    error_rate_var = tk.StringVar(value=str(DEDUP_BLOOM_ERROR_RATE))
+    ttk.Entry(settings_row4, textvariable=error_rate_var, width=8).pack(side=tk.LEFT, padx=5)
+
+    # Frame для строки настроек шардирования
+    settings_row5 = ttk.Frame(settings_frame)
+    settings_row5.pack(fill=tk.X, padx=5, pady=2)
+
+    plan_shards_var = tk.BooleanVar(value=True)
+    ttk.Checkbutton(settings_row5, text="Шарды по размеру файла",
+                    variable=plan_shards_var).pack(side=tk.LEFT, padx=5)
+    ttk.Label(settings_row5, text="Размер шарда, ГБ:").pack(side=tk.LEFT, padx=5)
+    shard_size_var = tk.StringVar(value=str(TARGET_SHARD_SIZE_GB))
+    ttk.Entry(settings_row5, textvariable=shard_size_var, width=5).pack(side=tk.LEFT, padx=5)
+    ttk.Label(settings_row5, text="Колонка маршрутизации:").pack(side=tk.LEFT, padx=5)
+    routing_column_var = tk.StringVar()
+    ttk.Entry(settings_row5, textvariable=routing_column_var, width=15).pack(side=tk.LEFT, padx=5)
+
     # Предпросмотр
     preview_frame = ttk.LabelFrame(dialog, text="Предпросмотр")
     preview_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -321,14 +936,10 @@ def import_csv_dialog():
     filename = [None]  # Используем список для хранения имени файла
 
     def select_file():
-        filename[0] = filedialog.askopenfilename(filetypes=[
-            ("CSV files", "*.csv"),
-            ("Text files", "*.txt"),
-            ("All files", "*.*")
-        ])
+        filename[0] = filedialog.askopenfilename(filetypes=IMPORT_FILE_TYPES)
         if filename[0]:
             current_delimiter = delimiter_var.get()
-            preview_rows = preview_csv_file(filename[0], encoding_var.get(), current_delimiter)
+            preview_rows = preview_source_file(filename[0], encoding_var.get(), current_delimiter)
             preview_text.delete(1.0, tk.END)
             for row in preview_rows:
                 preview_text.insert(tk.END, f"{row}\n")
@@ -344,11 +955,41 @@ def import_csv_dialog():
             messagebox.showerror("Ошибка", "Введите название индекса")
             return
 
+        error_rate = DEDUP_BLOOM_ERROR_RATE
+        if dedup_var.get():
+            try:
+                error_rate = parse_error_rate(error_rate_var.get())
+            except Exception as e:
+                messagebox.showerror("Ошибка", str(e))
+                return
+
         try:
+            # План шардов по оценке итогового размера индекса
+            plan = plan_shards(None, None, routing_column=routing_column_var.get().strip())
+            if plan_shards_var.get():
+                try:
+                    target_shard_size_gb = float(shard_size_var.get())
+                except ValueError:
+                    target_shard_size_gb = 0
+                if target_shard_size_gb <= 0:
+                    messagebox.showerror("Ошибка", "Размер шарда должен быть числом больше 0")
+                    return
+                estimated_docs, estimated_bytes = estimate_source_size(
+                    filename[0], encoding_var.get(), delimiter_var.get(), skip_first.get()
+                )
+                plan = plan_shards(estimated_docs, estimated_bytes, target_shard_size_gb,
+                                   routing_column_var.get().strip())
+            logging.info(f"План индекса {custom_index}: {format_shard_plan(plan)}")
+            if not messagebox.askokcancel("План импорта",
+                                          f"Индекс {custom_index}:\n{format_shard_plan(plan)}\n\n"
+                                          "Начать импорт?"):
+                return
+
             # Создаем индекс с указанным именем
-            global index_name
+            global index_name, selected_indices
             index_name = custom_index
-            if not create_index():
+            selected_indices = [index_name]
+            if not create_index(number_of_shards=plan["number_of_shards"]):
                 return
 
             # Создание прогресс-бара
@@ -370,16 +1011,29 @@ def import_csv_dialog():
                 status_label.config(text=f"{current_count} записей импортировано")
                 progress_window.update()
 
-            # Импорт данных
-            total_imported = import_csv_in_batches(
-                filename[0],
-                encoding_var.get(),
-                delimiter_var.get(),
-                skip_first.get()
-            )
+            duplicate_filter = None
+            if dedup_var.get():
+                duplicate_filter = DuplicateFilter(parse_column_list(key_columns_entry.get()),
+                                                   error_rate=error_rate)
 
-            progress_window.destroy()
-            messagebox.showinfo("Успех", f"Импортировано {total_imported} записей в индекс {index_name}")
+            # Импорт данных
+            try:
+                total_imported = import_file_in_batches(
+                    filename[0],
+                    encoding_var.get(),
+                    delimiter_var.get(),
+                    skip_first.get(),
+                    duplicate_filter=duplicate_filter,
+                    concurrency=plan["concurrency"],
+                    routing_column=plan["routing_column"]
+                )
+            finally:
+                invalidate_column_layout(index_name)
+                progress_window.destroy()
+            summary = f"Импортировано {total_imported} записей в индекс {index_name}"
+            if duplicate_filter:
+                summary += f"\nПропущено дубликатов: {duplicate_filter.dropped}"
+            messagebox.showinfo("Успех", summary)
             dialog.destroy()
 
         except Exception as e:
@@ -394,6 +1048,517 @@ def import_csv_dialog():
     ttk.Button(button_frame, text="Импортировать", command=start_import).pack(side=tk.LEFT, padx=5)
     ttk.Button(button_frame, text="Отмена", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
 
+# Статусы задач очереди импорта
+JOB_PENDING = "В очереди"
+JOB_RUNNING = "Выполняется"
+JOB_DONE = "Готово"
+JOB_FAILED = "Ошибка"
+
+
+def index_name_for_file(file_path):
+    """Имя индекса по имени файла с учётом ограничений Elasticsearch"""
+    stem = os.path.splitext(os.path.basename(file_path))[0].lower()
+    name = re.sub(r'[\\/*?"<>|,# :]+', '_', stem).lstrip('-_+.')
+    return name or index_name
+
+
+class ImportJob:
+    """Задача импорта одного файла в свой индекс"""
+
+    def __init__(self, file_path, target_index, encoding="utf-8", delimiter=",", skip_first=True,
+                 source_format=None, dedup=False, key_columns=None, routing_column=None,
+                 target_shard_size_gb=TARGET_SHARD_SIZE_GB, dedup_error_rate=DEDUP_BLOOM_ERROR_RATE):
+        self.file_path = file_path
+        self.source_format = source_format or detect_source_format(file_path)
+        self.dedup = dedup
+        self.key_columns = list(key_columns or [])
+        self.dedup_error_rate = dedup_error_rate
+        self.routing_column = routing_column or None
+        self.target_shard_size_gb = target_shard_size_gb
+        self.target_index = target_index
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.skip_first = skip_first
+        self.reset()
+
+    def reset(self):
+        self.status = JOB_PENDING
+        self.imported = 0
+        self.failed = 0
+        self.bytes_sent = 0
+        self.duplicate_filter = None
+        self.plan = None
+        self.plan_text = ""
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def duplicates(self):
+        return self.duplicate_filter.dropped if self.duplicate_filter else 0
+
+    def update_progress(self, imported, bytes_sent):
+        self.imported = imported
+        self.bytes_sent = bytes_sent
+
+    def throughput(self):
+        """Скорость импорта: (записей/с, байт/с)"""
+        if not self.started_at:
+            return 0.0, 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return self.imported / elapsed, self.bytes_sent / elapsed
+
+
+class ImportQueue:
+    """
+    Очередь импорта: задачи выполняются параллельно в пуле потоков,
+    а общий объём одновременно отправляемых bulk-запросов ограничен BulkBytesLimiter,
+    чтобы кластер был загружен на протяжении всей пачки файлов.
+    """
+
+    def __init__(self, max_jobs=MAX_CONCURRENT_IMPORT_JOBS, max_bulk_bytes=MAX_IN_FLIGHT_BULK_BYTES):
+        self.jobs = []
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="import")
+        self.bulk_limiter = BulkBytesLimiter(max_bulk_bytes)
+        self._index_plans = {}
+        self._planned_indices = {}
+        self._claimed_indices = set()
+        self._index_locks = {}
+        self._index_locks_guard = threading.Lock()
+
+    def add_job(self, job):
+        self.jobs.append(job)
+        return job
+
+    def remove_job(self, job):
+        if job.status != JOB_RUNNING and job in self.jobs:
+            self.jobs.remove(job)
+
+    def pending_jobs(self):
+        """Задачи в статусе ожидания, ещё не отправленные в пул"""
+        return [job for job in self.jobs if job.status == JOB_PENDING and not job.started_at]
+
+    def indices_to_create(self, jobs):
+        """
+        Индексы, которые будут созданы при запуске задач: существующие индексы
+        с такими именами удаляются. Индексы, уже созданные очередью, не пересоздаются.
+        """
+        return sorted({job.target_index for job in jobs} - self._claimed_indices)
+
+    def plan_indices(self, jobs):
+        """
+        План каждого создаваемого индекса по суммарной оценке объёма его файлов из jobs.
+        Вызывается до запуска, чтобы показать план пользователю.
+
+        Returns:
+            dict: индекс -> план (см. plan_shards)
+        """
+        return {
+            target_index: self._plan_index(target_index, jobs)
+            for target_index in self.indices_to_create(jobs)
+        }
+
+    def _plan_index(self, target_index, jobs):
+        estimated_docs, estimated_bytes = 0, 0
+        target_shard_size_gb = TARGET_SHARD_SIZE_GB
+        for job in jobs:
+            if job.target_index == target_index:
+                docs, size = estimate_source_size(job.file_path, job.encoding, job.delimiter,
+                                                  job.skip_first, job.source_format)
+                estimated_docs += docs
+                estimated_bytes += size
+                target_shard_size_gb = job.target_shard_size_gb
+        return plan_shards(estimated_docs, estimated_bytes, target_shard_size_gb)
+
+    def start(self, jobs=None, plans=None):
+        """
+        Запуск задач в статусе ожидания (по умолчанию всех, иначе подтверждённых из jobs).
+        plans - планы индексов из plan_indices, показанные пользователю; индексы
+        без плана планируются при подготовке.
+        """
+        pending = [job for job in (self.pending_jobs() if jobs is None else jobs)
+                   if job.status == JOB_PENDING and not job.started_at]
+        for target_index, plan in (plans or {}).items():
+            if target_index not in self._claimed_indices:
+                self._planned_indices[target_index] = plan
+        self._claimed_indices.update(job.target_index for job in pending)
+        for job in pending:
+            self._submit(job)
+        return len(pending)
+
+    def retry(self, job):
+        """
+        Повторный запуск завершившейся с ошибкой задачи. Индекс не пересоздаётся
+        (в него могут писать другие файлы), а записи файла имеют детерминированные _id,
+        поэтому уже загруженные строки перезаписываются, а не дублируются.
+        """
+        if job.status != JOB_FAILED:
+            return False
+        job.reset()
+        self._submit(job)
+        return True
+
+    def _submit(self, job):
+        # started_at выставляется заранее, чтобы задача не была запущена дважды
+        job.started_at = time.time()
+        self.executor.submit(self._run, job)
+
+    def _prepare_index(self, job):
+        """
+        Создаёт индекс один раз за сессию очереди, даже если в него пишут несколько файлов.
+        Используется план, подтверждённый при запуске; если его нет, число шардов
+        рассчитывается по суммарному объёму всех файлов этого индекса.
+        """
+        # Блокировка на индекс: подготовка разных индексов не ждёт друг друга
+        with self._index_locks_guard:
+            index_lock = self._index_locks.setdefault(job.target_index, threading.Lock())
+
+        with index_lock:
+            if job.target_index not in self._index_plans:
+                plan = self._planned_indices.pop(job.target_index, None)
+                if plan is None:
+                    job.plan_text = "Планирование..."
+                    # Копия списка: окно очереди может удалять задачи из другого потока
+                    plan = self._plan_index(job.target_index, list(self.jobs))
+                logging.info(f"План индекса {job.target_index}: {format_shard_plan(plan)}")
+                create_index(job.target_index, interactive=False,
+                             number_of_shards=plan["number_of_shards"])
+                self._index_plans[job.target_index] = plan
+
+            job.plan = dict(self._index_plans[job.target_index], routing_column=job.routing_column)
+            job.plan_text = format_shard_plan(job.plan)
+
+    def _run(self, job):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            self._prepare_index(job)
+            if job.dedup:
+                job.duplicate_filter = DuplicateFilter(job.key_columns,
+                                                       error_rate=job.dedup_error_rate)
+            job.imported = import_file_in_batches(
+                job.file_path,
+                job.encoding,
+                job.delimiter,
+                job.skip_first,
+                batch_size=IMPORT_QUEUE_BATCH_SIZE,
+                target_index=job.target_index,
+                bulk_limiter=self.bulk_limiter,
+                progress_callback=job.update_progress,
+                source_format=job.source_format,
+                duplicate_filter=job.duplicate_filter,
+                concurrency=job.plan["concurrency"],
+                routing_column=job.plan["routing_column"],
+                # Очередь поддерживает повтор: с _id по файлу и номеру строки
+                # он перезаписывает уже загруженные записи, а не дублирует их
+                id_prefix=source_id_prefix(job.file_path)
+            )
+            job.status = JOB_DONE
+            logging.info(f"Задача импорта {job.file_path} -> {job.target_index} завершена: "
+                         f"{job.imported} записей, пропущено дубликатов: {job.duplicates}")
+        except BulkImportError as e:
+            job.status = JOB_FAILED
+            job.imported = e.imported
+            job.failed = e.failed
+            job.error = str(e)
+            logging.error(f"Import job error ({job.file_path}): {e}")
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = str(e)
+            logging.error(f"Import job error ({job.file_path}): {e}")
+        finally:
+            invalidate_column_layout(job.target_index)
+            job.finished_at = time.time()
+
+
+import_queue = ImportQueue()
+
+
+def import_queue_dialog():
+    """Окно очереди импорта нескольких файлов"""
+    dialog = tk.Toplevel()
+    dialog.title("Очередь импорта")
+    dialog.geometry("1100x500")
+
+    # Настройки для добавляемых / выбранных задач
+    settings_frame = ttk.LabelFrame(dialog, text="Настройки задачи")
+    settings_frame.pack(fill=tk.X, padx=5, pady=5)
+
+    ttk.Label(settings_frame, text="Индекс:").pack(side=tk.LEFT, padx=5)
+    index_var = tk.StringVar(value=index_name)
+    ttk.Entry(settings_frame, textvariable=index_var, width=20).pack(side=tk.LEFT, padx=5)
+
+    index_from_file = tk.BooleanVar(value=True)
+    ttk.Checkbutton(settings_frame, text="По имени файла",
+                    variable=index_from_file).pack(side=tk.LEFT, padx=5)
+
+    ttk.Label(settings_frame, text="Кодировка:").pack(side=tk.LEFT, padx=5)
+    encoding_var = tk.StringVar(value="utf-8")
+    ttk.Combobox(settings_frame, textvariable=encoding_var,
+                 values=["utf-8", "cp1251"], width=8).pack(side=tk.LEFT, padx=5)
+
+    ttk.Label(settings_frame, text="Разделитель:").pack(side=tk.LEFT, padx=5)
+    delimiter_var = tk.StringVar(value=",")
+    ttk.Combobox(settings_frame, textvariable=delimiter_var,
+                 values=[",", ";", "\\t", "|"], width=4).pack(side=tk.LEFT, padx=5)
+
+    skip_first = tk.BooleanVar(value=True)
+    ttk.Checkbutton(settings_frame, text="Пропустить первую строку",
+                    variable=skip_first).pack(side=tk.LEFT, padx=5)
+
+    dedup_frame = ttk.Frame(dialog)
+    dedup_frame.pack(fill=tk.X, padx=5)
+
+    dedup_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(dedup_frame, text="Пропускать дубликаты",
+                    variable=dedup_var).pack(side=tk.LEFT, padx=5)
+    ttk.Label(dedup_frame, text="Ключевые колонки (пусто = вся строка):").pack(side=tk.LEFT, padx=5)
+    key_columns_var = tk.StringVar()
+    ttk.Entry(dedup_frame, textvariable=key_columns_var, width=30).pack(side=tk.LEFT, padx=5)
+    ttk.Label(dedup_frame, text="Доля ошибок фильтра:").pack(side=tk.LEFT, padx=5)
+    error_rate_var = tk.StringVar(value=str(DEDUP_BLOOM_ERROR_RATE))
+    ttk.Entry(dedup_frame, textvariable=error_rate_var, width=8).pack(side=tk.LEFT, padx=5)
+
+    ttk.Label(dedup_frame, text="Размер шарда, ГБ:").pack(side=tk.LEFT, padx=5)
+    shard_size_var = tk.StringVar(value=str(TARGET_SHARD_SIZE_GB))
+    ttk.Entry(dedup_frame, textvariable=shard_size_var, width=5).pack(side=tk.LEFT, padx=5)
+    ttk.Label(dedup_frame, text="Маршрутизация:").pack(side=tk.LEFT, padx=5)
+    routing_column_var = tk.StringVar()
+    ttk.Entry(dedup_frame, textvariable=routing_column_var, width=15).pack(side=tk.LEFT, padx=5)
+
+    def current_shard_size():
+        """Размер шарда из поля или None, если он некорректен"""
+        try:
+            size = float(shard_size_var.get())
+        except ValueError:
+            size = 0
+        if size <= 0:
+            messagebox.showerror("Ошибка", "Размер шарда должен быть числом больше 0", parent=dialog)
+            return None
+        return size
+
+    def current_error_rate():
+        """Доля ложных срабатываний из поля или None, если она некорректна"""
+        try:
+            return parse_error_rate(error_rate_var.get())
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e), parent=dialog)
+            return None
+
+    def current_delimiter():
+        delimiter = delimiter_var.get()
+        return "\t" if delimiter == "\\t" else delimiter
+
+    # Список задач
+    jobs_frame = ttk.Frame(dialog)
+    jobs_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    job_columns = ("file", "format", "index", "encoding", "delimiter", "status", "imported", "duplicates",
+                   "rate", "info")
+    job_headings = ("Файл", "Формат", "Индекс", "Кодировка", "Разд.", "Статус", "Записей", "Дубликатов",
+                    "Скорость", "Сообщение")
+    jobs_tree = ttk.Treeview(jobs_frame, columns=job_columns, show="headings", selectmode="extended")
+    for col, heading in zip(job_columns, job_headings):
+        jobs_tree.heading(col, text=heading)
+        jobs_tree.column(col, width=90)
+    jobs_tree.column("file", width=220)
+    jobs_tree.column("info", width=200)
+
+    jobs_scroll = ttk.Scrollbar(jobs_frame, orient=tk.VERTICAL, command=jobs_tree.yview)
+    jobs_tree.configure(yscrollcommand=jobs_scroll.set)
+    jobs_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+    jobs_tree.pack(fill=tk.BOTH, expand=True)
+
+    summary_label = ttk.Label(dialog, text="")
+    summary_label.pack(fill=tk.X, padx=5)
+
+    def selected_jobs():
+        return [import_queue.jobs[int(item)] for item in jobs_tree.selection()
+                if int(item) < len(import_queue.jobs)]
+
+    def refresh():
+        """Периодическое обновление списка задач (данные меняются из потоков импорта)"""
+        if not dialog.winfo_exists():
+            return
+        # Обновляем строки на месте, чтобы не сбрасывать выделение и прокрутку
+        for item in jobs_tree.get_children():
+            if int(item) >= len(import_queue.jobs):
+                jobs_tree.delete(item)
+        for i, job in enumerate(import_queue.jobs):
+            records_rate, bytes_rate = job.throughput()
+            rate = f"{records_rate:.0f} зап/с, {bytes_rate / 1024 / 1024:.1f} МБ/с" if job.started_at else ""
+            if not jobs_tree.exists(str(i)):
+                jobs_tree.insert("", tk.END, iid=str(i))
+            jobs_tree.item(str(i), values=(
+                os.path.basename(job.file_path),
+                job.source_format,
+                job.target_index,
+                job.encoding,
+                repr(job.delimiter).strip("'"),
+                job.status,
+                job.imported,
+                job.duplicates if job.dedup else "",
+                rate,
+                job.error or job.plan_text
+            ))
+
+        running = sum(1 for job in import_queue.jobs if job.status == JOB_RUNNING)
+        total = sum(job.imported for job in import_queue.jobs)
+        duplicates = sum(job.duplicates for job in import_queue.jobs)
+        summary_label.config(
+            text=f"Выполняется: {running}, импортировано всего: {total}, "
+                 f"пропущено дубликатов: {duplicates}, "
+                 f"в полёте: {import_queue.bulk_limiter.in_flight / 1024 / 1024:.1f} МБ"
+        )
+        dialog.after(500, refresh)
+
+    def add_files(paths):
+        target_shard_size_gb = current_shard_size()
+        if target_shard_size_gb is None:
+            return
+        error_rate = current_error_rate()
+        if error_rate is None:
+            return
+        for path in paths:
+            target = index_name_for_file(path) if index_from_file.get() else index_var.get().strip()
+            if not target:
+                messagebox.showerror("Ошибка", "Введите название индекса", parent=dialog)
+                return
+            import_queue.add_job(ImportJob(path, target, encoding_var.get(),
+                                           current_delimiter(), skip_first.get(),
+                                           dedup=dedup_var.get(),
+                                           key_columns=parse_column_list(key_columns_var.get()),
+                                           routing_column=routing_column_var.get().strip(),
+                                           target_shard_size_gb=target_shard_size_gb,
+                                           dedup_error_rate=error_rate))
+        refresh()
+
+    def on_add_files():
+        paths = filedialog.askopenfilenames(parent=dialog, filetypes=IMPORT_FILE_TYPES)
+        add_files(paths)
+
+    def on_add_directory():
+        directory = filedialog.askdirectory(parent=dialog)
+        if not directory:
+            return
+        paths = sorted(
+            path for path in glob.glob(os.path.join(directory, pattern_var.get() or "*.csv"))
+            if os.path.isfile(path)
+        )
+        if not paths:
+            messagebox.showwarning("Предупреждение", "Файлы по шаблону не найдены", parent=dialog)
+            return
+        add_files(paths)
+
+    def on_job_select(event):
+        """Подставляет настройки выбранной задачи в поля"""
+        jobs = selected_jobs()
+        if len(jobs) == 1:
+            job = jobs[0]
+            index_var.set(job.target_index)
+            encoding_var.set(job.encoding)
+            delimiter_var.set("\\t" if job.delimiter == "\t" else job.delimiter)
+            skip_first.set(job.skip_first)
+            dedup_var.set(job.dedup)
+            key_columns_var.set(", ".join(job.key_columns))
+            error_rate_var.set(str(job.dedup_error_rate))
+            shard_size_var.set(str(job.target_shard_size_gb))
+            routing_column_var.set(job.routing_column or "")
+
+    jobs_tree.bind('<<TreeviewSelect>>', on_job_select)
+
+    def on_apply():
+        """Применить настройки к выбранным задачам, ещё не запущенным"""
+        target_shard_size_gb = current_shard_size()
+        if target_shard_size_gb is None:
+            return
+        error_rate = current_error_rate()
+        if error_rate is None:
+            return
+        for job in selected_jobs():
+            if job.started_at:
+                continue
+            job.target_index = index_var.get().strip() or job.target_index
+            job.encoding = encoding_var.get()
+            job.delimiter = current_delimiter()
+            job.skip_first = skip_first.get()
+            job.dedup = dedup_var.get()
+            job.key_columns = parse_column_list(key_columns_var.get())
+            job.dedup_error_rate = error_rate
+            job.routing_column = routing_column_var.get().strip() or None
+            job.target_shard_size_gb = target_shard_size_gb
+        refresh()
+
+    def on_remove():
+        for job in selected_jobs():
+            import_queue.remove_job(job)
+        jobs_tree.selection_set(())
+        refresh()
+
+    def on_retry():
+        retried = sum(1 for job in selected_jobs() if import_queue.retry(job))
+        if not retried:
+            messagebox.showinfo("Информация", "Выберите задачи со статусом «Ошибка»", parent=dialog)
+
+    def on_start():
+        pending = import_queue.pending_jobs()
+        if not pending:
+            messagebox.showinfo("Информация", "Нет задач в очереди", parent=dialog)
+            return
+
+        # Запуск пересоздаёт индексы назначения, поэтому активные индексы поиска
+        # не трогаем, а удаление существующих подтверждает пользователь
+        new_indices = import_queue.indices_to_create(pending)
+        active = [idx for idx in new_indices if idx in selected_indices]
+        if active:
+            messagebox.showerror("Ошибка",
+                                 f"Нельзя пересоздать активный индекс: {', '.join(active)}. "
+                                 "Выберите другой индекс назначения или другой индекс для поиска.",
+                                 parent=dialog)
+            return
+        try:
+            existing = [idx for idx in new_indices if es.indices.exists(index=idx)]
+        except Exception as e:
+            logging.error(f"Error checking indices: {e}")
+            messagebox.showerror("Ошибка", f"Не удалось проверить индексы: {str(e)}", parent=dialog)
+            return
+
+        # План шардов показывается до начала загрузки, пока его ещё можно изменить
+        try:
+            plans = import_queue.plan_indices(pending)
+        except Exception as e:
+            logging.error(f"Error planning indices: {e}")
+            messagebox.showerror("Ошибка", f"Не удалось оценить размер индексов: {str(e)}",
+                                 parent=dialog)
+            return
+        message = "\n".join(f"Индекс {idx}: {format_shard_plan(plan)}" for idx, plan in plans.items())
+        if existing:
+            message += ("\n\nСледующие индексы уже существуют и будут удалены и созданы заново:\n"
+                        + "\n".join(existing))
+        if plans and not messagebox.askokcancel("План импорта", message + "\n\nНачать импорт?",
+                                                parent=dialog):
+            return
+        import_queue.start(pending, plans)
+
+    # Кнопки
+    button_frame = ttk.Frame(dialog)
+    button_frame.pack(fill=tk.X, pady=5)
+
+    ttk.Button(button_frame, text="Добавить файлы", command=on_add_files).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Добавить папку", command=on_add_directory).pack(side=tk.LEFT, padx=5)
+    pattern_var = tk.StringVar(value="*.csv")
+    ttk.Entry(button_frame, textvariable=pattern_var, width=10).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Применить к выбранным", command=on_apply).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Удалить", command=on_remove).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Повторить", command=on_retry).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Запустить", command=on_start).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Закрыть", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+
+    refresh()
+
+
 def export_to_xlsx():
     """Экспорт результатов поиска в XLSX"""
     if not tree.get_children():
@@ -419,7 +1584,7 @@ def export_to_xlsx():
 
 
 def select_index():
-    """Выбор индекса для поиска с возможностью удаления"""
+    """Выбор одного или нескольких индексов для поиска с возможностью удаления"""
     try:
         indices = list(es.indices.get_alias().keys())
         dialog = tk.Toplevel()
@@ -434,6 +1599,7 @@ def select_index():
         # Заголовок
         header_label = ttk.Label(main_frame, text="Доступные индексы:", font=('Arial', 10, 'bold'))
         header_label.pack(pady=5)
+        ttk.Label(main_frame, text="Ctrl/Shift + клик - поиск по нескольким индексам").pack()
 
         # Создаем фрейм с прокруткой
         list_frame = ttk.Frame(main_frame)
@@ -443,7 +1609,7 @@ def select_index():
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         # Используем Treeview вместо Listbox для лучшего визуального представления
-        tree = ttk.Treeview(list_frame, selectmode="browse", show="tree",
+        tree = ttk.Treeview(list_frame, selectmode="extended", show="tree",
                             yscrollcommand=scrollbar.set)
         tree.pack(fill=tk.BOTH, expand=True)
         scrollbar.config(command=tree.yview)
@@ -461,7 +1627,9 @@ def select_index():
             tree.delete(*tree.get_children())
             current_indices = list(es.indices.get_alias().keys())
             for idx in current_indices:
-                tree.insert("", tk.END, text=idx, values=(idx,))
+                item = tree.insert("", tk.END, text=idx, values=(idx,))
+                if idx in selected_indices:
+                    tree.selection_add(item)
 
         def show_index_info(event):
             """Показать информацию о выбранном индексе"""
@@ -485,13 +1653,14 @@ def select_index():
         tree.bind('<<TreeviewSelect>>', show_index_info)
 
         def on_select():
-            """Обработчик выбора индекса"""
+            """Обработчик выбора индексов (первый выбранный становится основным)"""
             selection = tree.selection()
             if selection:
-                global index_name
-                index_name = tree.item(selection[0])['text']
+                global index_name, selected_indices
+                selected_indices = [tree.item(item)['text'] for item in selection]
+                index_name = selected_indices[0]
                 dialog.destroy()
-                messagebox.showinfo("Информация", f"Выбран индекс: {index_name}")
+                messagebox.showinfo("Информация", f"Выбраны индексы: {', '.join(selected_indices)}")
                 perform_search()  # Обновляем результаты поиска для нового индекса
 
         def on_delete():
@@ -502,7 +1671,7 @@ def select_index():
                 return
 
             selected_index = tree.item(selection[0])['text']
-            if selected_index == index_name:
+            if selected_index in selected_indices:
                 messagebox.showwarning("Предупреждение",
                                        "Нельзя удалить текущий активный индекс. "
                                        "Сначала выберите другой индекс.")
@@ -547,76 +1716,611 @@ def select_index():
 
 
 
+SEARCH_RESULT_SIZE = 100
+
+# Профилирование и журнал медленных запросов
+SLOW_QUERY_THRESHOLD_MS = 1000
+SLOW_QUERY_LOG_FILE = 'slow_queries.log'
+PROFILE_TOP_CLAUSES = 15
+SOURCE_INDEX_COLUMN = "_index"
+
+# Индексы, по которым выполняется поиск (первый - основной index_name)
+selected_indices = [index_name]
+# Число совпадений по индексам для последнего запроса (None - ошибка поиска в индексе)
+last_hit_counts = {}
+
+# Кэш раскладки колонок по индексам: индекс -> список полей из маппинга
+column_layouts = {}
+# Колонки, выбранные пользователем для отображения: индекс -> список полей
+visible_columns = {}
+
+
+def flatten_mapping_properties(properties, prefix=""):
+    """Список полей маппинга в порядке объявления (вложенные объекты через точку)"""
+    fields = []
+    for name, definition in properties.items():
+        path = f"{prefix}{name}"
+        if "properties" in definition:
+            fields.extend(flatten_mapping_properties(definition["properties"], f"{path}."))
+        else:
+            fields.append(path)
+    return fields
+
+
+def get_column_layout(target_index=None):
+    """Раскладка колонок индекса, построенная по get_mapping один раз и закэшированная"""
+    target_index = target_index or index_name
+    if target_index in column_layouts:
+        return column_layouts[target_index]
+
+    try:
+        mapping = es.indices.get_mapping(index=target_index)
+    except Exception as e:
+        logging.error(f"Ошибка получения маппинга {target_index}: {e}")
+        return []
+
+    layout = []
+    for index_mapping in mapping.values():
+        for field in flatten_mapping_properties(index_mapping["mappings"].get("properties", {})):
+            if field not in layout:
+                layout.append(field)
+
+    # Пустой маппинг (индекс ещё не заполнен) не кэшируем
+    if layout:
+        column_layouts[target_index] = layout
+    return layout
+
+
+def invalidate_column_layout(target_index=None):
+    """Сброс кэша раскладки после пересоздания индекса или импорта"""
+    column_layouts.pop(target_index or index_name, None)
+
+
+def get_visible_columns(target_index=None):
+    """Колонки индекса, выбранные для отображения (по умолчанию все)"""
+    target_index = target_index or index_name
+    layout = get_column_layout(target_index)
+    chosen = visible_columns.get(target_index)
+    if not chosen:
+        return layout
+    return [field for field in layout if field in chosen]
+
+
+def get_source_value(source, path):
+    """Значение поля из _source, в том числе вложенного (путь через точку)"""
+    if path in source:
+        return source[path]
+    value = source
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return ""
+        value = value[part]
+    return value
+
+
+def build_search_body(query, target_index=None):
+    """Тело поискового запроса: каждое слово запроса - phrase_prefix по всем полям"""
+    target_index = target_index or index_name
+
+    # Разбиваем запрос на отдельные слова
+    query_terms = query.strip().split()
+
+    search_body = {
+        "query": {
+            "bool": {
+                "must": [
+                    # Каждое слово должно присутствовать (логическое И)
+                    {
+                        "multi_match": {
+                            "query": term,
+                            "fields": ["*"],
+                            "type": "phrase_prefix",
+                            "operator": "or"
+                        }
+                    } for term in query_terms
+                ]
+            }
+        },
+        "size": SEARCH_RESULT_SIZE
+    }
+
+    # Запрашиваем только отображаемые колонки, если пользователь их ограничил
+    if visible_columns.get(target_index):
+        search_body["_source"] = {"includes": get_visible_columns(target_index)}
+    return search_body
+
+
+def get_total_hits(response):
+    """Общее число совпадений (в ES 7+ hits.total - объект)"""
+    total = response["hits"]["total"]
+    return total["value"] if isinstance(total, dict) else total
+
+
 def search_index(query):
-    """Улучшенный поиск с AND логикой для частичных совпадений слов"""
+    """
+    Улучшенный поиск с AND логикой для частичных совпадений слов.
+    При выборе нескольких индексов запрос отправляется во все индексы
+    одним _msearch, результаты объединяются и ранжируются по релевантности.
+    """
+    global last_hit_counts
     try:
         if not query:
             return []
 
-        # Разбиваем запрос на отдельные слова
-        query_terms = query.strip().split()
-
-        search_body = {
-            "query": {
-                "bool": {
-                    "must": [
-                        # Каждое слово должно присутствовать (логическое И)
-                        {
-                            "multi_match": {
-                                "query": term,
-                                "fields": ["*"],
-                                "type": "phrase_prefix",
-                                "operator": "or"
-                            }
-                        } for term in query_terms
-                    ]
-                }
-            },
-            "size": 100
-        }
+        started = time.time()
+        if len(selected_indices) == 1:
+            response = es.search(
+                index=selected_indices[0],
+                body=build_search_body(query, selected_indices[0])
+            )
+            hits = response["hits"]["hits"]
+            last_hit_counts = {selected_indices[0]: get_total_hits(response)}
+        else:
+            searches = []
+            for target_index in selected_indices:
+                searches.append({"index": target_index})
+                searches.append(build_search_body(query, target_index))
+            response = es.msearch(body=searches)
+
+            hits = []
+            last_hit_counts = {}
+            for target_index, result in zip(selected_indices, response["responses"]):
+                if "error" in result:
+                    logging.error(f"Ошибка поиска в индексе {target_index}: {result['error']}")
+                    last_hit_counts[target_index] = None
+                    continue
+                hits.extend(result["hits"]["hits"])
+                last_hit_counts[target_index] = get_total_hits(result)
+
+            # Объединяем результаты по убыванию релевантности
+            hits.sort(key=lambda hit: hit.get("_score") or 0, reverse=True)
+            hits = hits[:SEARCH_RESULT_SIZE]
+
+        elapsed_ms = (time.time() - started) * 1000
+        if elapsed_ms >= SLOW_QUERY_THRESHOLD_MS:
+            record_slow_query(query, selected_indices, response.get("took", 0), elapsed_ms,
+                              last_hit_counts)
 
-        response = es.search(
-            index=index_name,
-            body=search_body
-        )
-        hits = response["hits"]["hits"]
         logging.info(f"Найдено {len(hits)} записей по запросу: {query}")
         return hits
     except Exception as e:
         logging.error(f"Ошибка поиска: {e}")
+        last_hit_counts = {target_index: None for target_index in selected_indices}
         messagebox.showerror("Ошибка", f"Ошибка при поиске: {str(e)}")
         return []
 
-def update_table(data):
-    """Обновление таблицы результатов"""
-    # Очистка существующих данных
-    for row in tree.get_children():
-        tree.delete(row)
 
-    if not data:
-        return
+def format_hit_counts(hit_counts):
+    """Строка состояния с числом совпадений по индексам"""
+    if not hit_counts:
+        return "Готово"
+    return ", ".join(
+        f"{target_index}: {'ошибка' if count is None else count}"
+        for target_index, count in hit_counts.items()
+    )
 
-    # Получаем все уникальные ключи из результатов
-    all_columns = set()
-    for result in data:
-        all_columns.update(result["_source"].keys())
 
-    # Обновляем колонки таблицы
+def record_slow_query(query, indices, took_ms, elapsed_ms, hit_counts, profile_summary=None):
+    """Запись медленного запроса в локальный журнал (JSON Lines)"""
+    entry = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "query": query,
+        "indices": list(indices),
+        "took_ms": took_ms,
+        "elapsed_ms": round(elapsed_ms),
+        "hits": hit_counts,
+    }
+    if profile_summary:
+        entry["profile"] = {
+            "query_ms": profile_summary["query_ms"],
+            "collector_ms": profile_summary["collector_ms"],
+            "fetch_ms": profile_summary["fetch_ms"],
+            "top_fields": profile_summary["fields"][:5],
+            "prefix_expansions": profile_summary["prefix_expansions"],
+            "prefix_queries": profile_summary["prefix_queries"],
+        }
+    try:
+        with open(SLOW_QUERY_LOG_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except Exception as e:
+        logging.error(f"Ошибка записи журнала медленных запросов: {e}")
+    logging.warning(f"Медленный запрос ({round(elapsed_ms)} мс): {query} в {', '.join(indices)}")
+
+
+def read_slow_query_log(limit=500):
+    """Последние записи журнала медленных запросов"""
+    if not os.path.exists(SLOW_QUERY_LOG_FILE):
+        return []
+    entries = []
+    with open(SLOW_QUERY_LOG_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries[-limit:]
+
+
+def nanos_to_ms(nanos):
+    return round(nanos / 1_000_000, 3)
+
+
+def count_prefix_expansions(clause_type, description):
+    """
+    Число терминов, в которые раскрылся префикс на text-полях (для листового узла профиля).
+
+    Каждое слово запроса - отдельный phrase_prefix из одного токена; после rewrite
+    он становится BooleanQuery из TermQuery (name:ivan, name:ivanov, ...) или одним
+    TermQuery, поэтому каждый TermQuery - одно раскрытие. Для слов из нескольких
+    токенов остаётся MultiPhraseQuery, где последняя позиция фразы - раскрытия
+    префикса: field:"petr (ivan ivanov)" - 2, field:"petr ivanov" - 1
+    """
+    if clause_type == "TermQuery":
+        return 1
+    count = 0
+    for phrase in re.findall(r'"([^"]*)"', description):
+        phrase = phrase.strip()
+        if phrase.endswith(")") and "(" in phrase:
+            count += len(phrase[phrase.rindex("(") + 1:-1].split())
+        elif phrase:
+            count += 1
+    return count
+
+
+def is_prefix_query(description):
+    """
+    PrefixQuery (phrase_prefix по keyword-подполям) вида field.keyword:ivan*.
+    Термины такого запроса раскрываются при выполнении, и Profile API их не показывает
+    """
+    return bool(re.match(r'^[+\-]?[^\s:()"]+:\S*\*$', description))
+
+
+def profile_field(description):
+    """Поле, к которому относится узел профиля (по описанию Lucene-запроса)"""
+    match = re.match(r'^[+\-]?([^\s:()"]+):', description)
+    return match.group(1) if match else None
+
+
+def collect_profile_clauses(nodes, clauses):
+    """Обход дерева запроса из профиля; листовые узлы - отдельные поля/термины"""
+    for node in nodes:
+        children = node.get("children", [])
+        clauses.append({
+            "type": node["type"],
+            "description": node["description"],
+            "time_ms": nanos_to_ms(node["time_in_nanos"]),
+            "leaf": not children,
+        })
+        collect_profile_clauses(children, clauses)
+
+
+def summarize_profile(profile):
+    """
+    Сводка ответа Profile API: время фаз по шардам, самые дорогие узлы запроса,
+    время по полям и число раскрытий префиксов
+    """
+    shards = []
+    clauses = []
+    for shard in profile["shards"]:
+        query_ms = rewrite_ms = collector_ms = 0
+        for search in shard["searches"]:
+            query_ms += sum(nanos_to_ms(node["time_in_nanos"]) for node in search["query"])
+            rewrite_ms += nanos_to_ms(search.get("rewrite_time", 0))
+            collector_ms += sum(nanos_to_ms(collector["time_in_nanos"]) for collector in search["collector"])
+            collect_profile_clauses(search["query"], clauses)
+        shards.append({
+            "id": shard["id"],
+            "query_ms": round(query_ms, 3),
+            "rewrite_ms": round(rewrite_ms, 3),
+            "collector_ms": round(collector_ms, 3),
+            # Фаза fetch есть в профиле начиная с Elasticsearch 7.16
+            "fetch_ms": nanos_to_ms(shard.get("fetch", {}).get("time_in_nanos", 0)),
+        })
+
+    field_times = {}
+    prefix_expansions = {}
+    prefix_queries = {}
+    for clause in clauses:
+        field = profile_field(clause["description"])
+        if not clause["leaf"] or not field:
+            continue
+        field_times[field] = field_times.get(field, 0) + clause["time_ms"]
+        if is_prefix_query(clause["description"]):
+            prefix_queries[field] = prefix_queries.get(field, 0) + 1
+            continue
+        expansions = count_prefix_expansions(clause["type"], clause["description"])
+        if expansions:
+            prefix_expansions[field] = prefix_expansions.get(field, 0) + expansions
+
+    return {
+        "shards": shards,
+        "query_ms": round(sum(shard["query_ms"] for shard in shards), 3),
+        "collector_ms": round(sum(shard["collector_ms"] for shard in shards), 3),
+        "fetch_ms": round(sum(shard["fetch_ms"] for shard in shards), 3),
+        "clauses": sorted(clauses, key=lambda clause: clause["time_ms"], reverse=True),
+        "fields": sorted(([field, round(ms, 3)] for field, ms in field_times.items()),
+                         key=lambda item: item[1], reverse=True),
+        "prefix_expansions": prefix_expansions,
+        "prefix_queries": prefix_queries,
+    }
+
+
+def profile_search(query, target_index):
+    """
+    Повторный запуск запроса с "profile": true
+
+    Returns:
+        dict: Сводка профиля (summarize_profile) плюс took_ms, elapsed_ms и hits
+    """
+    search_body = build_search_body(query, target_index)
+    search_body["profile"] = True
+
+    started = time.time()
+    response = es.search(index=target_index, body=search_body)
+    elapsed_ms = (time.time() - started) * 1000
+
+    summary = summarize_profile(response["profile"])
+    summary.update({
+        "took_ms": response.get("took", 0),
+        "elapsed_ms": round(elapsed_ms),
+        "hits": get_total_hits(response),
+    })
+    if elapsed_ms >= SLOW_QUERY_THRESHOLD_MS:
+        record_slow_query(query, [target_index], summary["took_ms"], elapsed_ms,
+                          {target_index: summary["hits"]}, summary)
+    return summary
+
+
+def format_profile_report(target_index, summary, top=PROFILE_TOP_CLAUSES):
+    """Текстовый отчёт профиля для окна профилирования"""
+    lines = [
+        f"Индекс: {target_index}",
+        f"Найдено: {summary['hits']}, took: {summary['took_ms']} мс, "
+        f"полное время: {summary['elapsed_ms']} мс",
+        f"Query: {summary['query_ms']} мс, collector: {summary['collector_ms']} мс, "
+        f"fetch: {summary['fetch_ms']} мс",
+        "",
+        "Шарды:",
+    ]
+    for shard in summary["shards"]:
+        lines.append(f"  {shard['id']}: query {shard['query_ms']} мс, rewrite {shard['rewrite_ms']} мс, "
+                     f"collector {shard['collector_ms']} мс, fetch {shard['fetch_ms']} мс")
+
+    lines += ["", "Самые дорогие узлы запроса:"]
+    for clause in summary["clauses"][:top]:
+        lines.append(f"  {clause['time_ms']:>10} мс  {clause['type']}: {clause['description'][:150]}")
+
+    lines += ["", "Время по полям:"]
+    for field, ms in summary["fields"][:top]:
+        expansions = summary["prefix_expansions"].get(field)
+        suffix = f", раскрытий префикса: {expansions}" if expansions else ""
+        prefix_queries = summary["prefix_queries"].get(field)
+        if prefix_queries:
+            suffix += f", PrefixQuery: {prefix_queries}"
+        lines.append(f"  {ms:>10} мс  {field}{suffix}")
+
+    lines += [
+        "",
+        f"Всего раскрытий префиксов (MultiPhraseQuery, text-поля): "
+        f"{sum(summary['prefix_expansions'].values())}",
+        f"PrefixQuery по keyword-подполям: {sum(summary['prefix_queries'].values())} "
+        "(число терминов Profile API для них не показывает)",
+    ]
+    return "\n".join(lines)
+
+
+def set_table_columns(new_columns):
+    """Перенастройка колонок таблицы только при изменении раскладки"""
     global columns
-    columns = list(all_columns)
+    if new_columns == columns:
+        return
+    columns = list(new_columns)
     tree["columns"] = columns
 
     # Настраиваем заголовки
     for col in columns:
-        tree.heading(col, text=col.title())
+        tree.heading(col, text="Индекс" if col == SOURCE_INDEX_COLUMN else col.title())
         tree.column(col, width=100)
 
+
+def update_table(data):
+    """Обновление таблицы результатов"""
+    # Очистка существующих данных
+    tree.delete(*tree.get_children())
+
+    # Число совпадений по каждому индексу (в том числе нулевое)
+    status_text.config(text=format_hit_counts(last_hit_counts))
+
+    if not data:
+        return
+
+    layout = []
+    if len(selected_indices) > 1:
+        # Колонка с индексом-источником при поиске по нескольким индексам
+        layout.append(SOURCE_INDEX_COLUMN)
+    for target_index in selected_indices:
+        for field in get_visible_columns(target_index):
+            if field not in layout:
+                layout.append(field)
+    if not [field for field in layout if field != SOURCE_INDEX_COLUMN]:
+        # Маппинг недоступен - собираем колонки из самих результатов
+        for result in data:
+            for key in result["_source"]:
+                if key not in layout:
+                    layout.append(key)
+    set_table_columns(layout)
+
     # Добавляем данные
     for result in data:
-        values = [result["_source"].get(col, "") for col in columns]
+        values = [
+            result["_index"] if col == SOURCE_INDEX_COLUMN else get_source_value(result["_source"], col)
+            for col in columns
+        ]
         tree.insert("", "end", values=values)
 
 
+def choose_columns_dialog():
+    """Выбор отображаемых колонок текущего индекса"""
+    layout = get_column_layout(index_name)
+    if not layout:
+        messagebox.showwarning("Предупреждение", f"В индексе {index_name} нет полей")
+        return
+
+    dialog = tk.Toplevel()
+    dialog.title(f"Колонки: {index_name}")
+    dialog.geometry("350x500")
+    dialog.grab_set()  # Делаем окно модальным
+
+    list_frame = ttk.Frame(dialog)
+    list_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+    scrollbar = ttk.Scrollbar(list_frame)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    listbox = tk.Listbox(list_frame, selectmode=tk.MULTIPLE, yscrollcommand=scrollbar.set,
+                         exportselection=False)
+    listbox.pack(fill=tk.BOTH, expand=True)
+    scrollbar.config(command=listbox.yview)
+
+    shown = set(get_visible_columns(index_name))
+    for i, field in enumerate(layout):
+        listbox.insert(tk.END, field)
+        if field in shown:
+            listbox.selection_set(i)
+
+    def on_apply():
+        chosen = [layout[i] for i in listbox.curselection()]
+        if not chosen:
+            messagebox.showwarning("Предупреждение", "Выберите хотя бы одну колонку", parent=dialog)
+            return
+        if len(chosen) == len(layout):
+            visible_columns.pop(index_name, None)
+        else:
+            visible_columns[index_name] = chosen
+        dialog.destroy()
+        perform_search()
+
+    def on_reset_cache():
+        """Перечитать маппинг (например, после добавления полей)"""
+        invalidate_column_layout(index_name)
+        dialog.destroy()
+        choose_columns_dialog()
+
+    button_frame = ttk.Frame(dialog)
+    button_frame.pack(fill=tk.X, pady=5)
+
+    ttk.Button(button_frame, text="Все",
+               command=lambda: listbox.selection_set(0, tk.END)).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Обновить",
+               command=on_reset_cache).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Применить", command=on_apply).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Отмена", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+
+
+def profile_query_dialog():
+    """Профилирование текущего запроса через Profile API"""
+    query = search_entry.get().strip()
+    if len(query) < 3:
+        messagebox.showwarning("Предупреждение", "Введите запрос для профилирования")
+        return
+
+    reports = []
+    for target_index in selected_indices:
+        try:
+            reports.append(format_profile_report(target_index, profile_search(query, target_index)))
+        except Exception as e:
+            logging.error(f"Profile error ({target_index}): {e}")
+            reports.append(f"Индекс: {target_index}\nОшибка профилирования: {str(e)}")
+
+    dialog = tk.Toplevel()
+    dialog.title(f"Профиль запроса: {query}")
+    dialog.geometry("900x600")
+
+    text_frame = ttk.Frame(dialog)
+    text_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    scroll_y = ttk.Scrollbar(text_frame)
+    scroll_y.pack(side=tk.RIGHT, fill=tk.Y)
+
+    report_text = tk.Text(text_frame, wrap=tk.NONE, yscrollcommand=scroll_y.set, font=('Courier', 9))
+    report_text.pack(fill=tk.BOTH, expand=True)
+    scroll_y.config(command=report_text.yview)
+
+    report_text.insert(tk.END, ("\n\n" + "-" * 80 + "\n\n").join(reports))
+    report_text.config(state=tk.DISABLED)
+
+    button_frame = ttk.Frame(dialog)
+    button_frame.pack(fill=tk.X, pady=5)
+
+    ttk.Button(button_frame, text="Повторить", command=lambda: (dialog.destroy(), profile_query_dialog())
+               ).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Медленные запросы",
+               command=slow_query_log_dialog).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Закрыть", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+
+
+def slow_query_log_dialog():
+    """Просмотр локального журнала медленных запросов"""
+    dialog = tk.Toplevel()
+    dialog.title(f"Медленные запросы (> {SLOW_QUERY_THRESHOLD_MS} мс)")
+    dialog.geometry("1000x500")
+
+    log_frame = ttk.Frame(dialog)
+    log_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    log_columns = ("timestamp", "query", "indices", "took", "elapsed", "profile")
+    log_headings = ("Время", "Запрос", "Индексы", "Took, мс", "Полное, мс", "Профиль")
+    log_tree = ttk.Treeview(log_frame, columns=log_columns, show="headings")
+    for col, heading in zip(log_columns, log_headings):
+        log_tree.heading(col, text=heading)
+        log_tree.column(col, width=90)
+    log_tree.column("timestamp", width=140)
+    log_tree.column("query", width=200)
+    log_tree.column("profile", width=380)
+
+    log_scroll = ttk.Scrollbar(log_frame, orient=tk.VERTICAL, command=log_tree.yview)
+    log_tree.configure(yscrollcommand=log_scroll.set)
+    log_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+    log_tree.pack(fill=tk.BOTH, expand=True)
+
+    def load_log():
+        log_tree.delete(*log_tree.get_children())
+        # Новые записи сверху
+        for entry in reversed(read_slow_query_log()):
+            profile = entry.get("profile")
+            profile_text = ""
+            if profile:
+                fields = ", ".join(f"{field} {ms} мс" for field, ms in profile["top_fields"])
+                profile_text = (f"query {profile['query_ms']}, collector {profile['collector_ms']}, "
+                                f"fetch {profile['fetch_ms']} мс; {fields}")
+            log_tree.insert("", tk.END, values=(
+                entry["timestamp"],
+                entry["query"],
+                ", ".join(entry["indices"]),
+                entry["took_ms"],
+                entry["elapsed_ms"],
+                profile_text
+            ))
+
+    def on_clear():
+        if messagebox.askyesno("Подтверждение", "Очистить журнал медленных запросов?", parent=dialog):
+            try:
+                if os.path.exists(SLOW_QUERY_LOG_FILE):
+                    os.remove(SLOW_QUERY_LOG_FILE)
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Ошибка очистки журнала: {str(e)}", parent=dialog)
+            load_log()
+
+    button_frame = ttk.Frame(dialog)
+    button_frame.pack(fill=tk.X, pady=5)
+
+    ttk.Button(button_frame, text="Обновить", command=load_log).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Очистить", command=on_clear).pack(side=tk.LEFT, padx=5)
+    ttk.Button(button_frame, text="Закрыть", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+
+    load_log()
+
+
 def perform_search(*args):
     """Выполнение поиска с задержкой"""
     query = search_entry.get()
@@ -627,7 +2331,9 @@ def perform_search(*args):
 
 def clear_search():
     """Очистка поиска"""
+    global last_hit_counts
     search_entry.delete(0, tk.END)
+    last_hit_counts = {}
     update_table([])
 
 
@@ -658,15 +2364,17 @@ def show_about():
     Версия 1.0
 
     Программа для работы с Elasticsearch:
-    - Импорт данных из CSV
+    - Импорт данных из CSV, JSON Lines, Parquet и XLSX
+    - Очередь импорта нескольких файлов
     - Поиск по индексам
     - Экспорт результатов в XLSX
 
     Поддерживаемые функции:
     - Полнотекстовый поиск
     - Импорт CSV с различными кодировками и разделителями
-    - Выбор индекса для поиска
+    - Выбор одного или нескольких индексов для поиска
     - Экспорт результатов
+    - Профилирование запросов и журнал медленных запросов
     """
     messagebox.showinfo("О программе", about_text)
 
@@ -687,6 +2395,7 @@ root.config(menu=menubar)
 file_menu = tk.Menu(menubar, tearoff=0)
 menubar.add_cascade(label="Файл", menu=file_menu)
 file_menu.add_command(label="Импорт CSV", command=import_csv_dialog)
+file_menu.add_command(label="Очередь импорта", command=import_queue_dialog)
 file_menu.add_command(label="Экспорт в XLSX", command=export_to_xlsx)
 file_menu.add_separator()
 file_menu.add_command(label="Выход", command=root.quit)
@@ -695,6 +2404,9 @@ file_menu.add_command(label="Выход", command=root.quit)
 index_menu = tk.Menu(menubar, tearoff=0)
 menubar.add_cascade(label="Индекс", menu=index_menu)
 index_menu.add_command(label="Выбрать индекс", command=select_index)
+index_menu.add_command(label="Колонки...", command=choose_columns_dialog)
+index_menu.add_command(label="Профилировать запрос", command=profile_query_dialog)
+index_menu.add_command(label="Медленные запросы", command=slow_query_log_dialog)
 index_menu.add_separator()
 index_menu.add_command(label="Очистить поиск", command=clear_search)
 
@@ -755,6 +2467,9 @@ button_frame.pack(fill=tk.X, padx=10, pady=5)
 ttk.Button(button_frame, text="Импорт CSV",
           command=import_csv_dialog).pack(side=tk.LEFT, padx=5)
 
+ttk.Button(button_frame, text="Очередь импорта",
+          command=import_queue_dialog).pack(side=tk.LEFT, padx=5)
+
 ttk.Button(button_frame, text="Экспорт в XLSX",
           command=export_to_xlsx).pack(side=tk.LEFT, padx=5)
 
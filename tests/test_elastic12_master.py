@@ -0,0 +1,515 @@
+"""
+Smoke-тесты конвейера импорта и поиска без Elasticsearch и GUI.
+
+Модуль elastic12_master при импорте создаёт окно Tk и клиент Elasticsearch,
+поэтому из исходника берутся только определения верхнего уровня: функции,
+классы и константы, а также импорты стандартной библиотеки.
+"""
+import ast
+import datetime
+import importlib
+import json
+import os
+import types
+import threading
+
+import pytest
+
+SOURCE = os.path.join(os.path.dirname(__file__), os.pardir, "elastic12_master.py")
+
+
+def load_definitions():
+    with open(SOURCE, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+
+    namespace = {"index_name": "test", "es": None}
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            module = node.module if isinstance(node, ast.ImportFrom) else node.names[0].name
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                continue  # сторонние зависимости в тестах не нужны
+            exec(compile(ast.Module(body=[node], type_ignores=[]), SOURCE, "exec"), namespace)
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            exec(compile(ast.Module(body=[node], type_ignores=[]), SOURCE, "exec"), namespace)
+        elif (isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name)
+              and node.targets[0].id.isupper()):
+            exec(compile(ast.Module(body=[node], type_ignores=[]), SOURCE, "exec"), namespace)
+    return namespace
+
+
+@pytest.fixture(scope="module")
+def app():
+    return load_definitions()
+
+
+def test_import_job_and_duplicate_filter_construct(app, tmp_path):
+    job = app["ImportJob"](str(tmp_path / "data.csv"), "data", routing_column="region",
+                           target_shard_size_gb=10)
+    assert job.routing_column == "region"
+    assert job.target_shard_size_gb == 10
+    assert job.status == app["JOB_PENDING"]
+    assert job.duplicates == 0
+
+    duplicate_filter = app["DuplicateFilter"](["a"])
+    assert not duplicate_filter.is_duplicate({"a": 1, "b": 1})
+    assert duplicate_filter.is_duplicate({"a": 1, "b": 2})
+    assert duplicate_filter.dropped == 1
+
+
+def test_duplicate_filter_switches_to_bloom(app):
+    duplicate_filter = app["DuplicateFilter"](memory_limit_mb=0.01)
+    kept = sum(not duplicate_filter.is_duplicate({"a": i % 2000}) for i in range(8000))
+    assert duplicate_filter.bloom is not None
+    assert 1990 <= kept <= 2000
+
+
+
+def test_duplicate_filter_splits_memory_limit(app):
+    duplicate_filter = app["DuplicateFilter"](memory_limit_mb=0.01, error_rate=0.01)
+    half = duplicate_filter.memory_limit // 2
+    assert duplicate_filter.max_exact_entries * app["DEDUP_EXACT_ENTRY_BYTES"] <= half
+    for i in range(duplicate_filter.max_exact_entries):
+        duplicate_filter.is_duplicate({"a": i})
+    assert len(duplicate_filter.bloom.bits) <= half
+    assert duplicate_filter.bloom.num_hashes == 7  # round(-log2(0.01))
+
+
+@pytest.mark.parametrize("text, expected", [("0.01", 0.01), ("0,05", 0.05), ("0", None),
+                                            ("1", None), ("abc", None)])
+def test_parse_error_rate(app, text, expected):
+    if expected is None:
+        with pytest.raises(Exception, match="больше 0 и меньше 1"):
+            app["parse_error_rate"](text)
+    else:
+        assert app["parse_error_rate"](text) == expected
+
+class FakeHelpers:
+    """Подмена elasticsearch.helpers: запоминает отправленные действия"""
+
+    def __init__(self, fail_batches=(), reject_per_batch=0):
+        self.fail_batches = set(fail_batches)
+        self.reject_per_batch = reject_per_batch
+        self.calls = []
+
+    def bulk(self, client, actions, raise_on_error=True):
+        self.calls.append(actions)
+        if len(self.calls) in self.fail_batches:
+            raise ConnectionError("bulk failed")
+        errors = [{"index": {"error": "rejected"}}] * self.reject_per_batch
+        return len(actions) - len(errors), errors
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_failed_batch_is_counted_and_not_resent(app, monkeypatch, concurrency):
+    fake = FakeHelpers(fail_batches={1})
+    monkeypatch.setitem(app, "helpers", fake)
+    documents = ({"n": i} for i in range(10))
+
+    with pytest.raises(app["BulkImportError"]) as error:
+        app["import_documents_in_batches"](documents, "test", batch_size=3, concurrency=concurrency)
+
+    assert error.value.failed == 3
+    assert error.value.imported == 7
+    assert sum(len(actions) for actions in fake.calls) == 10
+
+
+def test_rejected_documents_fail_import(app, monkeypatch):
+    monkeypatch.setitem(app, "helpers", FakeHelpers(reject_per_batch=1))
+    with pytest.raises(app["BulkImportError"]) as error:
+        app["import_documents_in_batches"]([{"n": i} for i in range(4)], "test", batch_size=2)
+    assert (error.value.imported, error.value.failed) == (2, 2)
+
+
+def test_document_ids_are_stable_across_runs(app, monkeypatch):
+    fake = FakeHelpers()
+    monkeypatch.setitem(app, "helpers", fake)
+    for _ in range(2):
+        imported = app["import_documents_in_batches"](
+            [{"n": i} for i in range(3)], "test", batch_size=10, id_prefix="file")
+        assert imported == 3
+    first, second = ([action["_id"] for action in actions] for actions in fake.calls)
+    assert first == second == ["file-1", "file-2", "file-3"]
+
+
+
+def test_file_import_assigns_ids_only_on_request(app, monkeypatch, tmp_path):
+    fake = FakeHelpers()
+    monkeypatch.setitem(app, "helpers", fake)
+    path = tmp_path / "data.jsonl"
+    path.write_text('{"n": 1}\n{"n": 2}\n', encoding="utf-8")
+
+    app["import_file_in_batches"](str(path), "utf-8", ",", target_index="test")
+    app["import_file_in_batches"](str(path), "utf-8", ",", target_index="test", id_prefix="file")
+    assert ["_id" in action for action in fake.calls[0]] == [False, False]
+    assert [action["_id"] for action in fake.calls[1]] == ["file-1", "file-2"]
+
+def test_duplicate_filter_rejects_unknown_key_columns(app):
+    duplicate_filter = app["DuplicateFilter"](["Phone"])
+    with pytest.raises(Exception, match="Phone"):
+        duplicate_filter.is_duplicate({"phone": "1", "name": "a"})
+
+
+
+def test_unknown_routing_column_stops_import(app, monkeypatch):
+    fake = FakeHelpers()
+    monkeypatch.setitem(app, "helpers", fake)
+    documents = [None, {"region": "1"}, {"region": "2"}]
+    assert app["import_documents_in_batches"](documents[1:], "test", routing_column="region") == 2
+    assert [action["_routing"] for action in fake.calls[0]] == ["1", "2"]
+
+    with pytest.raises(Exception, match="Region.*region"):
+        app["import_documents_in_batches"](documents, "test", routing_column="Region")
+    assert len(fake.calls) == 1
+
+def test_plan_shards_requires_positive_shard_size(app):
+    assert app["plan_shards"](10, 100 * 1024 ** 3, 30)["number_of_shards"] == 4
+    with pytest.raises(Exception, match="больше 0"):
+        app["plan_shards"](10, 100, 0)
+
+
+def test_indices_are_prepared_in_parallel(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app, "estimate_source_size", lambda *args: (1, 1))
+    # Оба create_index должны выполняться одновременно: при общей блокировке
+    # второй поток не дойдёт до барьера, и первый получит BrokenBarrierError
+    barrier = threading.Barrier(2, timeout=5)
+    monkeypatch.setitem(app, "create_index", lambda *args, **kwargs: barrier.wait())
+    queue = app["ImportQueue"](max_jobs=1)
+    jobs = [queue.add_job(app["ImportJob"](str(tmp_path / f"{name}.csv"), name))
+            for name in ("first", "second")]
+
+    errors = []
+
+    def prepare(job):
+        try:
+            queue._prepare_index(job)
+        except threading.BrokenBarrierError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=prepare, args=(job,)) for job in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(job.plan["number_of_shards"] == 1 for job in jobs)
+
+
+
+def test_queue_recreates_each_index_only_once(app, tmp_path):
+    queue = app["ImportQueue"](max_jobs=1)
+    queue._submit = lambda job: setattr(job, "started_at", 1)
+    first = [queue.add_job(app["ImportJob"](str(tmp_path / f"{name}.csv"), index))
+             for name, index in (("a", "x"), ("b", "y"), ("c", "x"))]
+    assert queue.pending_jobs() == first
+    assert queue.indices_to_create(first) == ["x", "y"]
+    assert queue.start(first) == 3
+
+    later = queue.add_job(app["ImportJob"](str(tmp_path / "d.csv"), "x"))
+    other = queue.add_job(app["ImportJob"](str(tmp_path / "e.csv"), "z"))
+    assert queue.pending_jobs() == [later, other]
+    assert queue.indices_to_create([later, other]) == ["z"]
+
+
+def test_queue_uses_plan_confirmed_at_start(app, monkeypatch, tmp_path):
+    estimates = []
+    monkeypatch.setitem(app, "estimate_source_size",
+                        lambda *args: estimates.append(args[0]) or (10, 40 * 1024 ** 3))
+    created = {}
+    monkeypatch.setitem(app, "create_index",
+                        lambda target, **kwargs: created.update({target: kwargs["number_of_shards"]}))
+    queue = app["ImportQueue"](max_jobs=1)
+    queue._submit = lambda job: setattr(job, "started_at", 1)
+    jobs = [queue.add_job(app["ImportJob"](str(tmp_path / f"{name}.csv"), "x")) for name in "ab"]
+
+    plans = queue.plan_indices(jobs)
+    assert list(plans) == ["x"] and plans["x"]["number_of_shards"] == 3
+    queue.start(jobs, plans)
+    estimates.clear()
+    for job in jobs:
+        queue._prepare_index(job)
+    assert estimates == [] and created == {"x": 3}
+    assert [job.plan["number_of_shards"] for job in jobs] == [3, 3]
+
+
+def test_plan_without_estimate_uses_one_shard(app):
+    plan = app["plan_shards"](None, None, routing_column="region")
+    assert (plan["number_of_shards"], plan["concurrency"]) == (1, 1)
+    assert app["format_shard_plan"](plan) == ("оценка отключена; шардов: 1, потоков импорта: 1, "
+                                              "маршрутизация по region")
+
+def test_format_hit_counts_marks_failed_indices(app):
+    assert app["format_hit_counts"]({}) == "Готово"
+    assert app["format_hit_counts"]({"a": 0, "b": None}) == "a: 0, b: ошибка"
+
+
+@pytest.mark.parametrize("content", ["", "name,phone\n", "name,phone\nskipped,row\n"])
+def test_csv_reader_handles_empty_and_header_only_files(app, tmp_path, content):
+    path = tmp_path / "empty.csv"
+    path.write_text(content, encoding="utf-8")
+    assert list(app["iter_csv_documents"](str(path), "utf-8", ",", True)) == []
+    assert app["estimate_source_size"](str(path), "utf-8", ",", True, "csv") == (0, 0)
+
+
+def test_csv_reader_keeps_header_handling(app, tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("a,,c\nskip,x,y\n1,,nan\n", encoding="utf-8")
+    documents = list(app["iter_csv_documents"](str(path), "utf-8", ",", True))
+    assert documents == [{"a": "skip", "col2": "x", "c": "y"}, {"a": "1", "col2": " ", "c": " "}]
+
+
+def test_prefix_expansion_counts(app):
+    count = app["count_prefix_expansions"]
+    assert count("TermQuery", "name:ivanov") == 1
+    assert count("MultiPhraseQuery", 'name:"(ivan ivanov ivanova)"') == 3
+    assert count("MultiPhraseQuery", 'name:"petr ivanov"') == 1
+    assert count("MultiPhraseQuery", 'name:"petr (ivan ivanov)"') == 2
+    assert app["is_prefix_query"]("name.keyword:Ivan*")
+    assert not app["is_prefix_query"]('name:"ivanov"')
+
+
+def profile_node(query_type, description, nanos, children=()):
+    return {"type": query_type, "description": description, "time_in_nanos": nanos,
+            "children": list(children)}
+
+
+def test_summarize_profile_single_word_rewrite(app):
+    """Реальная форма профиля для запроса "ivan": phrase_prefix из одного токена"""
+    profile = {"shards": [{
+        "id": "[node][idx][0]",
+        "searches": [{
+            "rewrite_time": 1000000,
+            "query": [profile_node("DisjunctionMaxQuery", "(name:ivan name:ivanov | city:ivanovo)", 6000000, [
+                profile_node("BooleanQuery", "name:ivan name:ivanov name:ivanova", 4000000, [
+                    profile_node("TermQuery", "name:ivan", 1000000),
+                    profile_node("TermQuery", "name:ivanov", 2000000),
+                    profile_node("TermQuery", "name:ivanova", 1000000),
+                ]),
+                profile_node("TermQuery", "city:ivanovo", 500000),
+                profile_node("PrefixQuery", "name.keyword:ivan*", 1500000),
+            ])],
+            "collector": [{"name": "TopScoreDocCollector", "time_in_nanos": 500000}],
+        }],
+    }]}
+    summary = app["summarize_profile"](profile)
+    assert summary["prefix_expansions"] == {"name": 3, "city": 1}
+    assert summary["prefix_queries"] == {"name.keyword": 1}
+    assert summary["fields"][0] == ["name", 4.0]
+
+
+def test_summarize_profile(app):
+    leaf = lambda description, nanos: {"type": "Leaf", "description": description, "time_in_nanos": nanos}
+    profile = {"shards": [{
+        "id": "[node][idx][0]",
+        "searches": [{
+            "rewrite_time": 2000000,
+            "query": [{
+                "type": "DisjunctionMaxQuery",
+                "description": "...",
+                "time_in_nanos": 9000000,
+                "children": [
+                    leaf('name:"(ivan ivanov ivanova)"', 5000000),
+                    leaf('city:"ivanovo"', 1000000),
+                    leaf("name.keyword:ivan*", 3000000),
+                ],
+            }],
+            "collector": [{"name": "TopScoreDocCollector", "time_in_nanos": 1500000}],
+        }],
+        "fetch": {"time_in_nanos": 3000000},
+    }]}
+    summary = app["summarize_profile"](profile)
+    assert summary["shards"][0] == {"id": "[node][idx][0]", "query_ms": 9.0, "rewrite_ms": 2.0,
+                                    "collector_ms": 1.5, "fetch_ms": 3.0}
+    assert summary["prefix_expansions"] == {"name": 3, "city": 1}
+    assert summary["prefix_queries"] == {"name.keyword": 1}
+    assert summary["fields"][0] == ["name", 5.0]
+
+
+def test_ndjson_reader_keeps_unicode_line_separators(app, tmp_path):
+    path = tmp_path / "data.jsonl"
+    path.write_text('{"text": "a\u2028b\u0085c\\u001e"}\r\n\n{"n": 2}\n', encoding="utf-8")
+    documents = list(app["iter_ndjson_documents"](str(path), "utf-8"))
+    assert documents == [{"text": "a\u2028b\u0085c\x1e"}, {"n": 2}]
+
+
+def test_invalid_ndjson_lines_fail_import(app, monkeypatch, tmp_path):
+    fake = FakeHelpers()
+    monkeypatch.setitem(app, "helpers", fake)
+    path = tmp_path / "data.jsonl"
+    path.write_text('{"n": 1}\nnot json\n[1, 2]\n{"n": 4, "v": NaN}\n', encoding="utf-8")
+
+    with pytest.raises(app["BulkImportError"]) as error:
+        app["import_documents_in_batches"](app["iter_ndjson_documents"](str(path), "utf-8"), "test",
+                                           id_prefix="file")
+    assert (error.value.imported, error.value.failed, error.value.invalid) == (2, 2, 2)
+    assert [action["_id"] for action in fake.calls[0]] == ["file-1", "file-4"]
+    assert fake.calls[0][1]["_source"] == {"n": 4, "v": None}
+
+
+def test_to_native_value_converts_durations(app):
+    value = {"took": datetime.timedelta(minutes=1, milliseconds=500), "at": datetime.time(12, 30)}
+    assert app["to_native_value"](value) == {"took": 60.5, "at": "12:30:00"}
+    assert json.dumps(app["to_native_value"]([datetime.timedelta(days=1)])) == "[86400.0]"
+
+
+def test_parquet_reader_streams_native_values(app, tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "data.parquet"
+    table = pa.table({
+        "n": [1, 2, 3],
+        "score": [0.5, float("nan"), None],
+        "took": pa.array([datetime.timedelta(seconds=1), None, datetime.timedelta(minutes=1)]),
+        "tags": [["a"], [], None],
+    })
+    pq.write_table(table, str(path), row_group_size=2)
+
+    documents = list(app["iter_source_documents"](str(path), "utf-8", ",", batch_size=2))
+    assert documents == [
+        {"n": 1, "score": 0.5, "took": 1.0, "tags": ["a"]},
+        {"n": 2, "score": None, "took": None, "tags": []},
+        {"n": 3, "score": None, "took": 60.0, "tags": None},
+    ]
+    assert app["estimate_source_size"](str(path), "utf-8", ",")[0] == 3
+
+
+def test_xlsx_reader_uses_first_row_as_headers(app, tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    path = tmp_path / "data.xlsx"
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in (["name", None, "born"],
+                ["a", 1, datetime.datetime(2020, 1, 2)],
+                ["b", None, None],
+                [None, None, None]):
+        sheet.append(row)
+    workbook.save(str(path))
+
+    documents = list(app["iter_source_documents"](str(path), "utf-8", ","))
+    assert documents == [{"name": "a", "col2": 1, "born": datetime.datetime(2020, 1, 2)},
+                         {"name": "b"}]
+
+
+def test_xlsx_reader_handles_empty_sheet(app, tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    path = tmp_path / "empty.xlsx"
+    openpyxl.Workbook().save(str(path))
+    assert list(app["iter_xlsx_documents"](str(path))) == []
+
+
+class FakeEs:
+    """Подмена клиента Elasticsearch: маппинги и ответы поиска по индексам задаются в тесте"""
+
+    def __init__(self, mappings=None, responses=None):
+        self.mappings = mappings or {}
+        self.responses = responses or {}
+        self.calls = []
+        self.indices = types.SimpleNamespace(get_mapping=self.get_mapping)
+
+    def search(self, index, body):
+        self.calls.append(("search", index))
+        return self.responses[index]
+
+    def msearch(self, body):
+        headers = body[::2]
+        self.calls.append(("msearch", [header["index"] for header in headers]))
+        if any(header["index"] not in self.responses for header in headers):
+            raise Exception("connection refused")
+        return {"took": 3, "responses": [self.responses[header["index"]] for header in headers]}
+
+    def get_mapping(self, index):
+        self.calls.append(("get_mapping", index))
+        if index not in self.mappings:
+            raise Exception(f"no such index [{index}]")
+        return {index: {"mappings": {"properties": self.mappings[index]}}}
+
+
+MAPPING = {
+    "name": {"type": "text"},
+    "address": {"properties": {"city": {"type": "text"}, "zip": {"type": "keyword"}}},
+    "phone": {"type": "keyword"},
+}
+
+
+@pytest.fixture
+def fake_es(app, monkeypatch):
+    fake = FakeEs({"test": MAPPING, "empty": {}})
+    monkeypatch.setitem(app, "es", fake)
+    monkeypatch.setitem(app, "column_layouts", {})
+    monkeypatch.setitem(app, "visible_columns", {})
+    return fake
+
+
+def test_column_layout_is_flattened_and_cached(app, fake_es):
+    layout = ["name", "address.city", "address.zip", "phone"]
+    assert app["get_column_layout"]("test") == layout
+    assert app["get_column_layout"]("test") == layout
+    assert fake_es.calls == [("get_mapping", "test")]
+
+    app["invalidate_column_layout"]("test")
+    assert app["get_column_layout"]("test") == layout
+    assert len(fake_es.calls) == 2
+
+
+def test_empty_or_missing_mapping_is_not_cached(app, fake_es):
+    assert app["get_column_layout"]("empty") == []
+    assert app["get_column_layout"]("missing") == []
+    assert app["column_layouts"] == {}
+
+
+def test_search_body_requests_only_visible_columns(app, fake_es):
+    body = app["build_search_body"]("ivan mos", "test")
+    assert "_source" not in body
+    assert [clause["multi_match"]["query"] for clause in body["query"]["bool"]["must"]] == ["ivan", "mos"]
+
+    app["visible_columns"]["test"] = {"phone", "address.city"}
+    body = app["build_search_body"]("ivan", "test")
+    assert body["_source"] == {"includes": ["address.city", "phone"]}
+    assert app["get_source_value"]({"address": {"city": "Moscow"}}, "address.city") == "Moscow"
+    assert app["get_source_value"]({"address": {}}, "address.zip") == ""
+
+
+def search_response(*scores, total=None):
+    hits = [{"_id": f"{score}", "_score": score, "_source": {}} for score in scores]
+    return {"took": 1, "hits": {"total": {"value": len(scores) if total is None else total}, "hits": hits}}
+
+
+@pytest.fixture
+def search_es(app, monkeypatch, fake_es):
+    fake_es.responses = {
+        "a": search_response(3.0, 1.0, total=250),
+        "b": search_response(2.5, 0.5),
+        "broken": {"error": {"type": "index_not_found_exception"}, "status": 404},
+    }
+    monkeypatch.setitem(app, "last_hit_counts", {})
+    monkeypatch.setitem(app, "SLOW_QUERY_THRESHOLD_MS", float("inf"))
+    return fake_es
+
+
+def test_single_index_search_uses_search(app, monkeypatch, search_es):
+    monkeypatch.setitem(app, "selected_indices", ["a"])
+    assert [hit["_score"] for hit in app["search_index"]("ivan")] == [3.0, 1.0]
+    assert search_es.calls == [("search", "a")]
+    assert app["last_hit_counts"] == {"a": 250}
+
+
+def test_msearch_merges_hits_by_score(app, monkeypatch, search_es):
+    monkeypatch.setitem(app, "selected_indices", ["a", "b", "broken"])
+    monkeypatch.setitem(app, "SEARCH_RESULT_SIZE", 3)
+    hits = app["search_index"]("ivan")
+    assert search_es.calls == [("msearch", ["a", "b", "broken"])]
+    assert [hit["_score"] for hit in hits] == [3.0, 2.5, 1.0]
+    assert app["last_hit_counts"] == {"a": 250, "b": 2, "broken": None}
+    assert app["format_hit_counts"](app["last_hit_counts"]) == "a: 250, b: 2, broken: ошибка"
+
+
+def test_failed_msearch_marks_all_indices(app, monkeypatch, search_es):
+    errors = []
+    monkeypatch.setitem(app, "messagebox",
+                        types.SimpleNamespace(showerror=lambda *args: errors.append(args)))
+    monkeypatch.setitem(app, "selected_indices", ["a", "missing"])
+    assert app["search_index"]("ivan") == []
+    assert app["last_hit_counts"] == {"a": None, "missing": None}
+    assert len(errors) == 1